@@ -1,8 +1,26 @@
+from datetime import timedelta
+
 from django.db import models
+from django.db.models import Q, Sum
 from django.utils.timezone import now, localdate
 
 from colorfield.fields import ColorField
 
+from timetracker.aggregates import tracked_duration
+
+
+class ProjectQuerySet(models.QuerySet):
+    def accessible_to(self, user):
+        """The user's personal projects plus their company's, as one filterable query."""
+        project_filter = Q(created_by=user, company=None)
+        if user.company_id:
+            project_filter |= Q(company_id=user.company_id)
+        return self.filter(project_filter)
+
+    def with_tracked_time(self):
+        """Annotate tracked_time, the summed duration of each project's time entries (running ones up to now)."""
+        return self.annotate(tracked_time=Sum(tracked_duration(prefix='time_entries__')))
+
 
 class Project(models.Model):
     STATUS_CHOICES = [
@@ -19,9 +37,16 @@ class Project(models.Model):
     company = models.ForeignKey('teams.Company', on_delete=models.SET_NULL, null=True, blank=True, related_name="projects")
     client = models.CharField(max_length=50, blank=True)
 
+    objects = ProjectQuerySet.as_manager()
+
     @property
     def total_tracked_time(self):
-        total_seconds = int(sum(entry.duration.total_seconds() for entry in self.time_entries.all()))
+        """Formatted tracked time; uses the with_tracked_time() annotation when present."""
+        if hasattr(self, 'tracked_time'):
+            tracked = self.tracked_time
+        else:
+            tracked = self.time_entries.aggregate(total=Sum(tracked_duration()))['total']
+        total_seconds = int((tracked or timedelta()).total_seconds())
         hours = total_seconds // 3600
         minutes = (total_seconds % 3600) // 60
         seconds = total_seconds % 60
@@ -61,6 +86,10 @@ class Task(models.Model):
 
     class Meta:
         ordering = ['due_date']
+        indexes = [
+            models.Index(fields=['user', 'is_completed', 'due_date'], name='task_user_open_due_idx'),
+            models.Index(fields=['user', 'completed_at'], name='task_user_completed_idx'),
+        ]
     
     def __str__(self):
         return self.title
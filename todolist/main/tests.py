@@ -1,3 +1,31 @@
+# Standard libs
+from datetime import timedelta
+
+# Django
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+
+# Local apps
+from teams.models import Company
+from timetracker.models import TimeEntry
+from .models import Project
+
+
+User = get_user_model()
+
+
+class ProjectTrackedTimeTests(TestCase):
+    def test_with_tracked_time_sums_stopped_and_running_entries(self):
+        company = Company.objects.create(name="Acme")
+        user = User.objects.create_user(email="ada@example.com", company=company)
+        website = Project.objects.create(title="Website", company=company)
+        Project.objects.create(title="Idle", company=company)
+        start_time = timezone.now() - timedelta(days=1)
+        TimeEntry.objects.create(user=user, project=website, name="Build", start_time=start_time, end_time=start_time + timedelta(hours=2, minutes=15))
+        TimeEntry.objects.create(user=user, project=website, name="Review", start_time=timezone.now() - timedelta(hours=1))
+
+        projects = {project.title: project for project in Project.objects.filter(company=company).with_tracked_time()}
 
-# Create your tests here.
+        self.assertTrue(projects["Website"].total_tracked_time.startswith("3h 15m"))
+        self.assertEqual(projects["Idle"].total_tracked_time, "0h 0m 0s")
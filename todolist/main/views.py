@@ -89,7 +89,12 @@ def edit_task(request, task_id):
 
 @login_required
 def archive(request):
-    return render(request, 'main/archive.html')
+    company_projects = request.user.company_projects
+    context = {
+        'personal_projects': list(request.user.personal_projects.with_tracked_time()),
+        'company_projects': list(company_projects.with_tracked_time()) if company_projects else [],
+    }
+    return render(request, 'main/archive.html', context)
 
 @require_http_methods(["POST"])
 @login_required
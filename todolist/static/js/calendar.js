@@ -37,7 +37,7 @@ document.addEventListener('DOMContentLoaded', function () {
         firstDay: 1,
         initialView: 'dayGridMonth',
         dayHeaderFormat: { weekday: 'long' },
-        events: allHolidaysJson,
+        events: calendarEventsUrl,
         eventClick: function(info) {
             if (!isEmployer) return;
             const type = info.event.extendedProps.type;
@@ -78,10 +78,10 @@ document.addEventListener('DOMContentLoaded', function () {
         return new Date(parts[0], parts[1] - 1, parts[2]);
     }
 
-    function convertToDataSource(dates, color) {
-        return dates.map(dateStr => ({
-            startDate: parseDate(dateStr),
-            endDate: parseDate(dateStr),
+    function convertToDataSource(ranges, color) {
+        return ranges.map(([startStr, endStr]) => ({
+            startDate: parseDate(startStr),
+            endDate: parseDate(endStr),
             color: color
         }));
     }
@@ -149,13 +149,40 @@ function formatDate(date) {
     return `${year}-${month}-${day}`;
 }
 
+const REPORT_JOB_POLL_INTERVAL = 2000;
+
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+async function waitForReportJob(statusUrl) {
+    while (true) {
+        const data = await sendRequest(statusUrl, 'GET');
+
+        if (!data || !data.success) {
+            return data;
+        }
+        if (['completed', 'failed', 'expired'].includes(data.job.status)) {
+            return data;
+        }
+
+        await sleep(REPORT_JOB_POLL_INTERVAL);
+    }
+}
+
 async function downloadMonthlyReports(button) {
     const url = button.dataset.url;
 
-    const data = await sendRequest(url, 'GET');
+    button.disabled = true;
+    showToast('Generating report, this may take a moment...', 'info');
 
-    if (data.success) {
-        for (const link of data.links.slice().sort()) {
+    const queued = await sendRequest(url, 'POST');
+    const data = queued && queued.success ? await waitForReportJob(queued.status_url) : queued;
+
+    button.disabled = false;
+
+    if (data && data.success && data.job.status === 'completed') {
+        for (const link of data.job.links) {
             const a = document.createElement('a');
             a.href = link;
             a.download = '';
@@ -165,6 +192,6 @@ async function downloadMonthlyReports(button) {
             document.body.removeChild(a);
         }
     } else {
-        showToast(data.error || 'Something went wrong.', 'danger');
+        showToast((data && (data.error || (data.job && data.job.error))) || 'Something went wrong.', 'danger');
     }
-}
\ No newline at end of file
+}
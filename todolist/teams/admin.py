@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db import transaction
 from .models import *
 from users.models import CustomUser
 
@@ -33,7 +34,45 @@ class CompanyAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
     inlines = [JobTitleInline, ExpenseInline, EmployeeInline]
 
-admin.site.register(Holiday)
+@admin.register(Holiday)
+class HolidayAdmin(admin.ModelAdmin):
+    def delete_queryset(self, request, queryset):
+        # One by one, so Holiday.delete() keeps the company's pending counters in step.
+        with transaction.atomic():
+            for holiday in queryset:
+                holiday.delete()
 admin.site.register(Document)
 admin.site.register(Expense)
-admin.site.register(Invitation)
\ No newline at end of file
+admin.site.register(Invitation)
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('project', 'report_type', 'start_date', 'end_date', 'status', 'created_at', 'finished_at')
+    list_filter = ('report_type', 'status')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+
+@admin.register(HolidayLedgerEntry)
+class HolidayLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'leave_year', 'days', 'kind', 'holiday', 'created_at')
+    list_filter = ('kind', 'leave_year')
+
+    # Entries are append-only and must go through HolidayLedgerEntry.objects.record()
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(HolidayBalance)
+class HolidayBalanceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'leave_year', 'used_days')
+    list_filter = ('leave_year',)
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'sent_at', 'claimed_at', 'last_error')
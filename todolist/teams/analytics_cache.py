@@ -0,0 +1,111 @@
+# Standard libs
+from datetime import date
+import uuid
+
+# Django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+
+# Every cached result is stored together with the version tokens it was computed
+# against; invalidating replaces a token, so stale results simply stop matching.
+
+def company_time_version_key(company_id):
+    return f"analytics:version:company_time:{company_id}"
+
+def company_projects_version_key(company_id):
+    return f"analytics:version:company_projects:{company_id}"
+
+def user_projects_version_key(user_id):
+    """Personal projects (company None) of a user; their time shows up in the user's own views only."""
+    return f"analytics:version:user_projects:{user_id}"
+
+def user_version_key(user_id):
+    return f"analytics:version:user:{user_id}"
+
+def invalidate(version_keys):
+    keys = set(version_keys)
+    if keys:
+        # Deferred to commit so a concurrent request cannot cache pre-commit data under the new token.
+        transaction.on_commit(lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None))
+
+def invalidate_company_time(*company_ids):
+    invalidate(company_time_version_key(company_id) for company_id in company_ids if company_id)
+
+def invalidate_company_projects(*company_ids):
+    invalidate(company_projects_version_key(company_id) for company_id in company_ids if company_id)
+
+def invalidate_user_projects(*user_ids):
+    invalidate(user_projects_version_key(user_id) for user_id in user_ids if user_id)
+
+def invalidate_users(*user_ids):
+    invalidate(user_version_key(user_id) for user_id in user_ids if user_id)
+
+def get_period_key(filter_option):
+    """Filter ranges are computed from today's date and bucketed in the active timezone."""
+    return f"{filter_option}:{date.today().isoformat()}:{timezone.get_current_timezone_name()}"
+
+def get_or_compute_many(entries, compute, timeout=None):
+    """
+    Return {item: data}, reading every result and version token in one cache round trip.
+
+    entries maps each item to (result_key, version_keys); compute(items) must return
+    {item: data} for the items that were missing or stale. Results are kept for timeout
+    seconds, ANALYTICS_CACHE_TIMEOUT by default.
+    """
+    version_keys = {key for _, keys in entries.values() for key in keys}
+    values = cache.get_many([result_key for result_key, _ in entries.values()] + list(version_keys))
+
+    missing_versions = version_keys - values.keys()
+    if missing_versions:
+        for key in missing_versions:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+        values.update(cache.get_many(missing_versions))
+
+    results = {}
+    stale = {}
+    for item, (result_key, keys) in entries.items():
+        versions = [values.get(key) for key in keys]
+        cached = values.get(result_key)
+        if cached is not None and cached[0] == versions:
+            results[item] = cached[1]
+        else:
+            stale[item] = (result_key, versions)
+
+    if stale:
+        computed = compute(list(stale))
+        cache.set_many(
+            {result_key: (versions, computed[item]) for item, (result_key, versions) in stale.items()},
+            timeout=timeout or settings.ANALYTICS_CACHE_TIMEOUT
+        )
+        results.update(computed)
+
+    return results
+
+def cached_company_charts(company, filter_option, compute):
+    """
+    Cache compute() until the company's time entries or projects change.
+
+    Results must not depend on the clock: running timers are cached as entries and their
+    elapsed time added on every read, so it is not frozen for ANALYTICS_CACHE_TIMEOUT.
+    """
+    result_key = f"analytics:company:{company.id}:{get_period_key(filter_option)}"
+    version_keys = [company_time_version_key(company.id), company_projects_version_key(company.id)]
+    return get_or_compute_many(
+        {company.id: (result_key, version_keys)},
+        lambda items: {company.id: compute()}
+    )[company.id]
+
+def cached_users_analytics(user_ids, company, filter_option, compute):
+    """compute(user_ids) must return {user_id: data} for the given users; like cached_company_charts(), without running time."""
+    period_key = get_period_key(filter_option)
+    entries = {
+        user_id: (
+            f"analytics:user:{user_id}:{company.id}:{period_key}",
+            [user_version_key(user_id), company_projects_version_key(company.id)]
+        )
+        for user_id in user_ids
+    }
+    return get_or_compute_many(entries, compute)
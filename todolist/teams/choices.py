@@ -74,3 +74,15 @@ HOLIDAY_TYPES = [
     ('bank_holiday', 'Bank Holiday'),
     ('sick_day', 'Sick Day'),
 ]
+
+REPORT_TYPES = [
+    ('monthly_pdf', 'Monthly PDF'),
+    ('monthly_xlsx', 'Monthly Excel'),
+]
+
+HOLIDAY_LEDGER_KINDS = [
+    ('opening', 'Opening Balance'),
+    ('charge', 'Charge'),
+    ('refund', 'Refund'),
+    ('reset', 'Reset'),
+]
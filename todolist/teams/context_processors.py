@@ -0,0 +1,54 @@
+# Django
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+# Local apps
+from main.models import Project
+from teams.analytics_cache import get_or_compute_many, invalidate
+
+
+def company_navigation_version_key(company_id):
+    return f"navigation:version:company:{company_id}"
+
+def user_navigation_version_key(user_id):
+    return f"navigation:version:user:{user_id}"
+
+def invalidate_company_navigation(*company_ids):
+    invalidate(company_navigation_version_key(company_id) for company_id in company_ids if company_id)
+
+def invalidate_user_navigation(*user_ids):
+    invalidate(user_navigation_version_key(user_id) for user_id in user_ids if user_id)
+
+def compute_navigation(user):
+    pending_requests = 0
+    if user.is_employer and user.company_id:
+        pending_requests = user.company.total_pending_holidays + user.company.join_requests.count()
+
+    return {
+        'pending_requests': pending_requests,
+        'projects': list(Project.objects.accessible_to(user).values('id', 'title', 'color')),
+    }
+
+def get_navigation(user):
+    """Badge counts and the project menu (id, title, color) for the page chrome, cached per user."""
+    version_keys = [user_navigation_version_key(user.id)]
+    if user.company_id:
+        version_keys.append(company_navigation_version_key(user.company_id))
+
+    # Company and role are part of the key, so joining, leaving or promotion needs no invalidation.
+    entries = {user.id: (f"navigation:user:{user.id}:{user.company_id}:{user.role}", version_keys)}
+    return get_or_compute_many(
+        entries,
+        lambda items: {user.id: compute_navigation(user)},
+        timeout=settings.NAVIGATION_CACHE_TIMEOUT
+    )[user.id]
+
+def navigation(request):
+    user = getattr(request, 'user', None)
+    if not user or not user.is_authenticated:
+        return {}
+
+    if not hasattr(request, '_navigation'):
+        request._navigation = SimpleLazyObject(lambda: get_navigation(user))
+
+    return {'navigation': request._navigation}
@@ -0,0 +1,139 @@
+# Standard libs
+from datetime import timedelta
+import time
+import uuid
+
+# Django
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+# Local apps
+from teams.models import OutboundEmail
+
+
+# A worker that dies mid-batch leaves its emails in 'sending'; they are retried after this long.
+# Live workers renew the claim before each message, so only a single send can outlast it.
+STALE_CLAIM_AFTER = timedelta(minutes=10)
+MAX_RETRY_DELAY = timedelta(hours=6)
+
+def enqueue_email(subject, body, to, from_email=None):
+    """Queue one email for the send_queued_emails worker; to is a list of addresses."""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+
+def enqueue_emails(messages):
+    """Queue (subject, body, from_email, to) tuples, the send_mass_mail() format, with one insert."""
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(subject=subject, body=body, from_email=from_email or settings.DEFAULT_FROM_EMAIL, to=list(to))
+        for subject, body, from_email, to in messages
+    ])
+
+def retry_delay(attempts):
+    """Exponential backoff: OUTBOUND_EMAIL_RETRY_DELAY seconds, doubled per failed attempt, capped."""
+    return min(timedelta(seconds=settings.OUTBOUND_EMAIL_RETRY_DELAY * 2 ** (attempts - 1)), MAX_RETRY_DELAY)
+
+def claim_batch(limit):
+    """Atomically mark up to limit due emails as sending and return them, oldest first."""
+    now = timezone.now()
+    due = (
+        Q(status='pending', next_attempt_at__lte=now)
+        | Q(status='sending', claimed_at__lt=now - STALE_CLAIM_AFTER)
+    )
+    ids = list(OutboundEmail.objects.filter(due).order_by('next_attempt_at').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+
+    # Another worker may claim some of the same rows first; the token tells ours apart.
+    token = uuid.uuid4().hex
+    OutboundEmail.objects.filter(due, id__in=ids).update(status='sending', claim_token=token, claimed_at=now)
+    return list(OutboundEmail.objects.filter(claim_token=token, status='sending').order_by('next_attempt_at'))
+
+def record_failure(email, error):
+    email.last_error = str(error)
+    if email.attempts >= settings.OUTBOUND_EMAIL_MAX_ATTEMPTS:
+        email.status = 'failed'
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+
+def renew_claim(email):
+    """Restart the stale timer of a claimed email; False if another worker has reclaimed it since."""
+    return bool(
+        OutboundEmail.objects
+        .filter(id=email.id, status='sending', claim_token=email.claim_token)
+        .update(claimed_at=timezone.now())
+    )
+
+def save_outcome(email):
+    """Store the outcome unless another worker has reclaimed the email since; returns whether it was stored."""
+    token, email.claim_token = email.claim_token, ''
+    return bool(
+        OutboundEmail.objects
+        .filter(id=email.id, claim_token=token)
+        .update(
+            status=email.status,
+            attempts=email.attempts,
+            next_attempt_at=email.next_attempt_at,
+            last_error=email.last_error,
+            sent_at=email.sent_at,
+            claim_token='',
+        )
+    )
+
+def send_batch(emails, connection=None, rate_limit=None):
+    """
+    Send claimed emails over one connection, recording each outcome. Returns (sent, failed).
+
+    Failed emails are retried with backoff until OUTBOUND_EMAIL_MAX_ATTEMPTS is reached.
+    rate_limit caps messages per second (OUTBOUND_EMAIL_RATE_LIMIT by default, 0 for no cap).
+    Emails another worker reclaimed while this one was busy are skipped and counted in neither.
+    """
+    if rate_limit is None:
+        rate_limit = settings.OUTBOUND_EMAIL_RATE_LIMIT
+    connection = connection or get_connection(settings.OUTBOUND_EMAIL_BACKEND)
+    interval = 1 / rate_limit if rate_limit else 0
+
+    try:
+        connection.open()
+    except Exception as e:
+        failed = 0
+        for email in emails:
+            email.attempts += 1
+            record_failure(email, e)
+            failed += save_outcome(email)
+        return 0, failed
+
+    sent = failed = 0
+    last_sent = None
+    try:
+        for email in emails:
+            if interval and last_sent is not None:
+                time.sleep(max(0, interval - (time.monotonic() - last_sent)))
+            last_sent = time.monotonic()
+
+            if not renew_claim(email):
+                continue
+
+            message = EmailMessage(email.subject, email.body, email.from_email, email.to, connection=connection)
+            email.attempts += 1
+            try:
+                message.send()
+            except Exception as e:
+                failed += 1
+                record_failure(email, e)
+            else:
+                sent += 1
+                email.status = 'sent'
+                email.sent_at = timezone.now()
+                email.last_error = ''
+            save_outcome(email)
+    finally:
+        connection.close()
+
+    return sent, failed
@@ -1,33 +1,82 @@
+# Standard libs
+from datetime import timedelta
 import os
+import time
 
-from django.core.management.base import BaseCommand
+# Django
 from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+# Local apps
+from teams.models import ReportJob
 
 
 class Command(BaseCommand):
-    help = "Deletes all files from media/tmp/reports/."
+    help = "Expires finished report jobs and deletes stale files from media/tmp/reports/."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-hours', type=float, default=24, help="Delete artifacts older than this many hours.")
 
     def handle(self, *args, **options):
+        max_age = timedelta(hours=options['max_age_hours'])
+        cutoff = timezone.now() - max_age
+
+        expired_jobs = self.expire_jobs(cutoff)
+        removed_files = self.remove_orphaned_files(max_age)
+
+        self.stdout.write(f"Expired {expired_jobs} job(s), deleted {removed_files} orphaned file(s).")
+
+    def expire_jobs(self, cutoff):
+        jobs = ReportJob.objects.filter(status__in=['completed', 'failed'], finished_at__lt=cutoff)
+        expired = 0
+
+        for job in jobs:
+            for path in job.files:
+                try:
+                    default_storage.delete(path)
+                    self.stdout.write(f"[DELETED] {path}")
+                except Exception as e:
+                    self.stderr.write(f"[ERROR] Failed to delete {path}: {e}")
+
+            job.status = 'expired'
+            job.files = []
+            job.save(update_fields=['status', 'files'])
+            expired += 1
+
+        return expired
+
+    def remove_orphaned_files(self, max_age):
         temp_dir = os.path.join(settings.MEDIA_ROOT, 'tmp', 'reports')
 
         if not os.path.exists(temp_dir):
             self.stdout.write(f"Directory does not exist: {temp_dir}")
-            return
+            return 0
 
+        active_files = {
+            os.path.normpath(os.path.join(settings.MEDIA_ROOT, path))
+            for files in ReportJob.objects.filter(status__in=['pending', 'running', 'completed', 'failed']).values_list('files', flat=True)
+            for path in files
+        }
+        oldest_mtime = time.time() - max_age.total_seconds()
         removed_files = 0
 
-        for filename in os.listdir(temp_dir):
-            file_path = os.path.join(temp_dir, filename)
+        for dirpath, dirnames, filenames in os.walk(temp_dir, topdown=False):
+            for filename in filenames:
+                file_path = os.path.normpath(os.path.join(dirpath, filename))
+
+                if file_path in active_files or os.path.getmtime(file_path) >= oldest_mtime:
+                    continue
 
-            if os.path.isfile(file_path):
                 try:
                     os.remove(file_path)
                     removed_files += 1
-                    self.stdout.write(f"[DELETED] {filename}")
+                    self.stdout.write(f"[DELETED] {os.path.relpath(file_path, temp_dir)}")
                 except Exception as e:
                     self.stderr.write(f"[ERROR] Failed to delete {filename}: {e}")
 
-        if removed_files == 0:
-            self.stdout.write("No files to delete.")
-        else:
-            self.stdout.write(f"Deleted {removed_files} file(s).")
+            if dirpath != temp_dir and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+
+        return removed_files
@@ -0,0 +1,50 @@
+# Django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+# Local apps
+from teams.models import Company, Holiday
+
+
+class Command(BaseCommand):
+    help = "Compares the pending holiday counters on each company with the holidays table and repairs any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without repairing it.")
+
+    def handle(self, *args, **options):
+        counter_fields = Company.PENDING_HOLIDAY_COUNTERS
+
+        drifted = 0
+        with transaction.atomic():
+            # Lock the companies first so the counts cannot move while they are compared.
+            companies = list(Company.objects.select_for_update().only('id', 'name', *counter_fields.values()))
+
+            actual = {}
+            rows = (
+                Holiday.objects
+                .filter(status__in=counter_fields.keys())
+                .values('company_id', 'status')
+                .annotate(total=Count('id'))
+                .order_by()
+            )
+            for row in rows:
+                actual[(row['company_id'], counter_fields[row['status']])] = row['total']
+
+            for company in companies:
+                changes = {}
+                for field in counter_fields.values():
+                    expected = actual.get((company.id, field), 0)
+                    stored = getattr(company, field)
+                    if stored != expected:
+                        changes[field] = expected
+                        self.stdout.write(f"[DRIFT] {company.name}: {field} is {stored}, expected {expected}")
+
+                if changes:
+                    drifted += 1
+                    if not options['dry_run']:
+                        Company.objects.filter(id=company.id).update(**changes)
+
+        action = "Found" if options['dry_run'] else "Repaired"
+        self.stdout.write(f"{action} drift in {drifted} company(ies).")
@@ -0,0 +1,73 @@
+# Django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+# Local apps
+from teams.models import HolidayBalance, HolidayLedgerEntry
+
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = (
+        "Replays the holiday ledger and compares it with the yearly balances that used_holidays is read from. "
+        "Users without ledger history get an opening entry for the used_holidays figure from before the ledger."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without repairing it.")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        drifted = 0
+
+        with transaction.atomic():
+            # Lock the balances first so no holiday can be charged while the ledger is replayed.
+            stored = {
+                (balance.user_id, balance.leave_year): balance
+                for balance in HolidayBalance.objects.select_for_update()
+            }
+
+            if dry_run:
+                with_history = HolidayLedgerEntry.objects.order_by().values('user_id').distinct()
+                opened = User.objects.exclude(id__in=with_history).exclude(opening_used_holidays=0).count()
+            else:
+                users = list(User.objects.exclude(opening_used_holidays=0).select_for_update().values_list('id', flat=True))
+                opened = len(HolidayLedgerEntry.objects.open(users))
+                stored.update(
+                    ((balance.user_id, balance.leave_year), balance)
+                    for balance in HolidayBalance.objects.select_for_update().filter(user_id__in=users)
+                )
+
+            expected = {
+                (row['user_id'], row['leave_year']): row['total']
+                for row in HolidayLedgerEntry.objects.values('user_id', 'leave_year').annotate(total=Sum('days')).order_by()
+            }
+
+            missing = []
+            for key in stored.keys() | expected.keys():
+                balance = stored.get(key)
+                days = expected.get(key, 0)
+                if (balance.used_days if balance else 0) == days:
+                    continue
+
+                drifted += 1
+                user_id, leave_year = key
+                self.stdout.write(f"[DRIFT] user {user_id} in {leave_year}: balance is {balance.used_days if balance else 0}, ledger gives {days}")
+                if dry_run:
+                    continue
+                if balance:
+                    HolidayBalance.objects.filter(id=balance.id).update(used_days=days)
+                else:
+                    missing.append(HolidayBalance(user_id=user_id, leave_year=leave_year, used_days=days))
+
+            if not dry_run:
+                HolidayBalance.objects.bulk_create(missing)
+
+        action = "Found" if dry_run else "Repaired"
+        self.stdout.write(
+            f"{action} drift in {drifted} balance(s); "
+            f"{'would open' if dry_run else 'opened'} the ledger for {opened} user(s)."
+        )
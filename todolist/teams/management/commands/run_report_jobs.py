@@ -0,0 +1,93 @@
+# Standard libs
+from datetime import timedelta
+import time
+import traceback
+
+# Django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+# Local apps
+from teams.models import ReportJob
+from teams.reports import run_report_job
+
+
+domain = getattr(settings, 'SITE_DOMAIN', '127.0.0.1')
+base_url = f"https://{domain}/"
+
+# A worker that dies mid-job leaves it 'running'; it is failed after this long so the user can request it again.
+STALE_JOB_AFTER = timedelta(minutes=30)
+
+def fail_stale_jobs():
+    """Mark jobs that have been running for longer than STALE_JOB_AFTER as failed, returning how many."""
+    now = timezone.now()
+    return ReportJob.objects.filter(status='running', started_at__lt=now - STALE_JOB_AFTER).update(
+        status='failed',
+        error="The report worker stopped before the report was finished.",
+        finished_at=now
+    )
+
+def claim_next_job():
+    """Atomically move the oldest pending job to running, returning it (or None if the queue is empty)."""
+    fail_stale_jobs()
+    while True:
+        job = ReportJob.objects.filter(status='pending').order_by('created_at').first()
+        if job is None:
+            return None
+
+        claimed = ReportJob.objects.filter(id=job.id, status='pending').update(
+            status='running',
+            started_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+class Command(BaseCommand):
+    help = "Processes queued report jobs from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty instead of polling.")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to wait between polls when idle.")
+        parser.add_argument('--max-jobs', type=int, default=0, help="Exit after processing this many jobs (0 = no limit).")
+
+    def handle(self, *args, **options):
+        processed = 0
+
+        while not options['max_jobs'] or processed < options['max_jobs']:
+            job = claim_next_job()
+
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.process(job)
+            processed += 1
+
+        self.stdout.write(f"Processed {processed} job(s).")
+
+    def process(self, job):
+        try:
+            job.files = run_report_job(job, base_url)
+            job.status = 'completed'
+        except Exception as e:
+            job.status = 'failed'
+            # The error is shown to the user; the details stay in the worker's output.
+            job.error = "The report could not be generated."
+            self.stderr.write(f"[FAILED] Job {job.id}: {e}\n{traceback.format_exc()}")
+
+        job.finished_at = timezone.now()
+        # Matches nothing if the job was failed as stale (and possibly re-requested) while it ran.
+        saved = ReportJob.objects.filter(id=job.id, status='running').update(
+            files=job.files,
+            status=job.status,
+            error=job.error,
+            finished_at=job.finished_at
+        )
+        if not saved:
+            self.stderr.write(f"[DISCARDED] Job {job.id}: it is no longer running, so its result was not saved.")
+        elif job.status == 'completed':
+            self.stdout.write(f"[COMPLETED] Job {job.id}: {job} ({len(job.files)} file(s))")
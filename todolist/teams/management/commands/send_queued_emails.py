@@ -0,0 +1,37 @@
+# Standard libs
+import time
+
+# Django
+from django.core.management.base import BaseCommand
+
+# Local apps
+from teams.mail import claim_batch, send_batch
+
+
+class Command(BaseCommand):
+    help = "Sends queued outbound emails in batches, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once nothing is due instead of polling.")
+        parser.add_argument('--poll-interval', type=float, default=5.0, help="Seconds to wait between polls when idle.")
+        parser.add_argument('--batch-size', type=int, default=100, help="Emails sent per connection.")
+        parser.add_argument('--rate-limit', type=float, default=None, help="Maximum emails per second (defaults to OUTBOUND_EMAIL_RATE_LIMIT).")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+
+        while True:
+            emails = claim_batch(options['batch_size'])
+
+            if not emails:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            sent, failed = send_batch(emails, rate_limit=options['rate_limit'])
+            total_sent += sent
+            total_failed += failed
+            self.stdout.write(f"[BATCH] Sent {sent}, failed {failed} of {len(emails)} email(s).")
+
+        self.stdout.write(f"Sent {total_sent} email(s), {total_failed} failure(s).")
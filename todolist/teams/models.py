@@ -1,13 +1,17 @@
 # Standard libs
+from collections import defaultdict
 from datetime import timedelta
 import os
 
 # Django
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.utils.text import slugify
 from .choices import *
+from .working_calendar import WorkingCalendar
 
 
 User = get_user_model()
@@ -20,16 +24,6 @@ def receipt_upload_path(instance, filename):
     company = instance.user.company.name
     return f'receipts/{company}/{filename}'
 
-def calculate_weekdays(start_date, end_date):
-        delta = timedelta(days=1)
-        current = start_date
-        count = 0
-        while current <= end_date:
-            if current.weekday() < 5:
-                count += 1
-            current += delta
-        return count
-
 class Company(models.Model):
     COMPANY_TYPES = COMPANY_TYPES
 
@@ -53,6 +47,17 @@ class Company(models.Model):
     country = models.CharField(max_length=100, blank=True)
     zip_code = models.CharField(max_length=10, blank=True)
 
+    # Denormalized holiday request counters, maintained by Holiday.save() and Holiday.delete()
+    pending_holidays_count = models.PositiveIntegerField(default=0, editable=False)
+    pending_edit_holidays_count = models.PositiveIntegerField(default=0, editable=False)
+    pending_delete_holidays_count = models.PositiveIntegerField(default=0, editable=False)
+
+    PENDING_HOLIDAY_COUNTERS = {
+        'pending': 'pending_holidays_count',
+        'pending_edit': 'pending_edit_holidays_count',
+        'pending_delete': 'pending_delete_holidays_count',
+    }
+
     @property
     def pending_holidays(self):
         return self.holidays.filter(status="pending")
@@ -67,7 +72,24 @@ class Company(models.Model):
 
     @property
     def total_pending_holidays(self):
-        return self.pending_holidays.count() + self.pending_edit_holidays.count() + self.pending_delete_holidays.count()
+        return self.pending_holidays_count + self.pending_edit_holidays_count + self.pending_delete_holidays_count
+
+    @classmethod
+    def move_pending_holiday(cls, company_id, old_status, new_status):
+        """Move one holiday between the pending counters; statuses without a counter (or None) are ignored."""
+        if old_status == new_status:
+            return
+
+        changes = {}
+        if old_status in cls.PENDING_HOLIDAY_COUNTERS:
+            field = cls.PENDING_HOLIDAY_COUNTERS[old_status]
+            changes[field] = Greatest(F(field) - 1, 0)
+        if new_status in cls.PENDING_HOLIDAY_COUNTERS:
+            field = cls.PENDING_HOLIDAY_COUNTERS[new_status]
+            changes[field] = F(field) + 1
+
+        if changes:
+            cls.objects.filter(id=company_id).update(**changes)
 
     class Meta:
         ordering = ['name']
@@ -76,6 +98,14 @@ class Company(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+
+        # The pending counters only change through move_pending_holiday(); writing back the values
+        # loaded earlier in the request would undo concurrent holiday approvals.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.PENDING_HOLIDAY_COUNTERS.values()
+            ]
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -177,23 +207,51 @@ class Holiday(models.Model):
 
     class Meta:
         ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['company', 'status'], name='holiday_company_status_idx'),
+        ]
+
+    def locked_status(self):
+        """Status stored in the database, read under a row lock, or None if the row does not exist."""
+        return Holiday.objects.select_for_update().filter(pk=self.pk).values_list('status', flat=True).first()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        tracks_status = update_fields is None or 'status' in update_fields
+
+        with transaction.atomic():
+            # Locked, so two concurrent status changes cannot both move the counters from the same status.
+            saved_status = None if self._state.adding or not tracks_status else self.locked_status()
+            super().save(*args, **kwargs)
+
+            if tracks_status:
+                Company.move_pending_holiday(self.company_id, saved_status, self.status)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            saved_status = self.locked_status()
+            result = super().delete(*args, **kwargs)
+            if saved_status is not None:
+                Company.move_pending_holiday(self.company_id, saved_status, None)
+        return result
 
     @property
     def dates(self):
-        current = self.start_date
-        dates_list = []
-        while current <= self.end_date:
-            dates_list.append(current)
-            current += timedelta(days=1)
-        return dates_list
+        return (self.start_date + timedelta(days=offset) for offset in range((self.end_date - self.start_date).days + 1))
+
+    @property
+    def working_calendar(self):
+        if not hasattr(self, '_working_calendar'):
+            self._working_calendar = WorkingCalendar.for_company(self.company_id)
+        return self._working_calendar
 
     @property
     def number_of_days(self):
-        return calculate_weekdays(self.start_date, self.end_date)
+        return self.working_calendar.count_holiday_days(self.type, self.start_date, self.end_date)
 
     @property
     def number_of_pending_days(self):
-        return calculate_weekdays(self.pending_start_date, self.pending_end_date)
+        return self.working_calendar.count_holiday_days(self.pending_type or self.type, self.pending_start_date, self.pending_end_date)
 
     def clear_pending(self):
         self.pending_start_date = None
@@ -215,6 +273,218 @@ class Holiday(models.Model):
         return f"{self.start_date} to {self.end_date} ({self.get_type_display()})"
 
 
+class HolidayLedgerManager(models.Manager):
+    def open(self, user_ids):
+        """
+        Give each user without ledger history an opening entry for the used_holidays figure kept on
+        the user from before the ledger existed. Call it with the users' balances locked (see
+        HolidayBalance.objects.lock()) so concurrent callers cannot both open the same user.
+        """
+        opened = set(self.filter(user_id__in=user_ids).order_by().values_list('user_id', flat=True).distinct())
+        pending = (
+            User.objects
+            .filter(id__in=set(user_ids) - opened)
+            .exclude(opening_used_holidays=0)
+            .values_list('id', 'company_id', 'opening_used_holidays')
+        )
+        openings = [
+            HolidayLedgerEntry(
+                user_id=user_id,
+                company_id=company_id,
+                leave_year=timezone.localdate().year,
+                days=days,
+                kind='opening',
+            )
+            for user_id, company_id, days in pending
+        ]
+        if openings:
+            HolidayBalance.objects.add_entries(self.bulk_create(openings))
+        return openings
+
+    def record(self, entries):
+        """
+        Append unsaved ledger entries and apply them to the yearly balances.
+
+        Entries for the same user, holiday and leave year are netted first; zero-day entries are
+        dropped. Callers lock the balances with HolidayBalance.objects.lock() inside their transaction first.
+        """
+        netted = {}
+        for entry in entries:
+            key = (entry.user_id, entry.holiday_id, entry.leave_year)
+            if key in netted:
+                netted[key].days += entry.days
+            else:
+                netted[key] = entry
+
+        entries = [entry for entry in netted.values() if entry.days]
+        for entry in entries:
+            if entry.kind in ('charge', 'refund'):
+                entry.kind = 'charge' if entry.days > 0 else 'refund'
+        if not entries:
+            return []
+
+        with transaction.atomic():
+            self.open({entry.user_id for entry in entries})
+            entries = self.bulk_create(entries)
+            HolidayBalance.objects.add_entries(entries)
+
+        return entries
+
+    def charged_days(self, holiday, user_ids=None):
+        """Map user id to the days the holiday currently holds of their allowance, as recorded in the ledger."""
+        entries = self.filter(holiday=holiday)
+        if user_ids is not None:
+            entries = entries.filter(user_id__in=user_ids)
+        return dict(entries.values('user_id').annotate(total=Sum('days')).values_list('user_id', 'total').order_by())
+
+    def refunds(self, holiday, user_ids=None):
+        """
+        Unsaved entries giving back what the holiday was charged to its users, in the leave years it was
+        charged in. Refunds follow the ledger rather than a recount, which changes with the bank holidays.
+        """
+        entries = self.filter(holiday=holiday)
+        if user_ids is not None:
+            entries = entries.filter(user_id__in=user_ids)
+        charged = entries.values('user_id', 'leave_year').annotate(total=Sum('days')).order_by()
+        return [
+            HolidayLedgerEntry(
+                user_id=row['user_id'],
+                company_id=holiday.company_id,
+                holiday=holiday,
+                leave_year=row['leave_year'],
+                days=-row['total'],
+                kind='refund',
+            )
+            for row in charged if row['total']
+        ]
+
+    def reset(self, user):
+        """Zero every yearly balance of a user, e.g. when they leave their company."""
+        HolidayBalance.objects.lock([user], [])
+        balances = HolidayBalance.objects.filter(user=user).exclude(used_days=0)
+        return self.record([
+            HolidayLedgerEntry(
+                user_id=user.id,
+                company_id=user.company_id,
+                leave_year=balance.leave_year,
+                days=-balance.used_days,
+                kind='reset',
+            )
+            for balance in balances
+        ])
+
+
+class HolidayLedgerEntry(models.Model):
+    """
+    Append-only record of every change to a user's used holiday days.
+
+    Replaying the ledger gives the yearly HolidayBalance rows, whose sum is the user's used_holidays.
+    """
+    KINDS = HOLIDAY_LEDGER_KINDS
+
+    user = models.ForeignKey("users.CustomUser", on_delete=models.CASCADE, related_name='holiday_ledger_entries')
+    company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True, blank=True, related_name='holiday_ledger_entries')
+    holiday = models.ForeignKey(Holiday, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    leave_year = models.PositiveSmallIntegerField()
+    days = models.IntegerField()
+    kind = models.CharField(max_length=20, choices=KINDS)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = HolidayLedgerManager()
+
+    class Meta:
+        verbose_name = 'Holiday Ledger Entry'
+        verbose_name_plural = 'Holiday Ledger Entries'
+        ordering = ['id']
+
+    @classmethod
+    def for_holiday(cls, holiday, user_id, days, start_date=None):
+        """Unsaved entry charging (or, with negative days, refunding) a holiday in the leave year it starts in."""
+        return cls(
+            user_id=user_id,
+            company_id=holiday.company_id,
+            holiday=holiday,
+            leave_year=(start_date or holiday.start_date).year,
+            days=days,
+            kind='charge' if days > 0 else 'refund',
+        )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Holiday ledger entries cannot be changed once recorded.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.user} {self.days:+d} day(s) in {self.leave_year} ({self.get_kind_display()})"
+
+
+class HolidayBalanceManager(models.Manager):
+    def add_entries(self, entries):
+        """Add ledger entries to the balances in place, creating missing rows first."""
+        totals = defaultdict(int)
+        for entry in entries:
+            totals[(entry.user_id, entry.leave_year)] += entry.days
+
+        self.bulk_create(
+            [HolidayBalance(user_id=user_id, leave_year=leave_year) for user_id, leave_year in totals],
+            ignore_conflicts=True
+        )
+
+        user_ids_by_change = defaultdict(list)
+        for (user_id, leave_year), days in totals.items():
+            if days:
+                user_ids_by_change[(leave_year, days)].append(user_id)
+
+        for (leave_year, days), user_ids in user_ids_by_change.items():
+            self.filter(leave_year=leave_year, user_id__in=user_ids).update(used_days=F('used_days') + days)
+
+    def lock(self, users, leave_years):
+        """
+        Lock the balances of users before charging them in leave_years, so concurrent requests cannot
+        overspend, and set each user's used_holidays to the locked total. Returns the users as a list.
+
+        Missing rows (and one for the current year, where opening entries go) are created first so there
+        is always a row to lock; the user rows themselves are not locked.
+        """
+        users = list(users)
+        user_ids = [user.id for user in users]
+        years = set(leave_years) | {timezone.localdate().year}
+        self.bulk_create(
+            [HolidayBalance(user_id=user_id, leave_year=leave_year) for user_id in user_ids for leave_year in years],
+            ignore_conflicts=True
+        )
+
+        totals = defaultdict(int)
+        for user_id, used_days in self.select_for_update().filter(user_id__in=user_ids).values_list('user_id', 'used_days'):
+            totals[user_id] += used_days
+        for entry in HolidayLedgerEntry.objects.open(user_ids):
+            totals[entry.user_id] += entry.days
+
+        for user in users:
+            user.used_holidays = totals[user.id]
+        return users
+
+    def used_days(self, user, leave_year):
+        return self.filter(user=user, leave_year=leave_year).values_list('used_days', flat=True).first() or 0
+
+
+class HolidayBalance(models.Model):
+    """Running total of a user's ledger entries for one leave year, so reading a balance is a single row."""
+
+    user = models.ForeignKey("users.CustomUser", on_delete=models.CASCADE, related_name='holiday_balances')
+    leave_year = models.PositiveSmallIntegerField()
+    used_days = models.IntegerField(default=0)
+
+    objects = HolidayBalanceManager()
+
+    class Meta:
+        unique_together = ('user', 'leave_year')
+        ordering = ['leave_year']
+
+    def __str__(self):
+        return f"{self.user} used {self.used_days} day(s) in {self.leave_year}"
+
+
 class JoinRequest(models.Model):
     user = models.ForeignKey("users.CustomUser", on_delete=models.CASCADE, related_name='join_requests', blank=True, null=True)
     company = models.ForeignKey("teams.Company", on_delete=models.CASCADE, related_name='join_requests')
@@ -234,3 +504,72 @@ class Invitation(models.Model):
 
     def __str__(self):
         return f"Invitation for {self.email} by {self.invited_by.email} to join {self.invited_by.company.name}"
+
+
+class ReportJob(models.Model):
+    REPORT_TYPES = REPORT_TYPES
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    ]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='report_jobs')
+    project = models.ForeignKey("main.Project", on_delete=models.CASCADE, related_name='report_jobs')
+    requested_by = models.ForeignKey("users.CustomUser", on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    report_type = models.CharField(max_length=20, choices=REPORT_TYPES)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    timezone = models.CharField(max_length=32, default='UTC')
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    files = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed', 'expired')
+
+    def __str__(self):
+        return f"{self.get_report_type_display()} for {self.project} ({self.start_date} - {self.end_date}, {self.status})"
+
+
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outboundemail_due_idx')]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
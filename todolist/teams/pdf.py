@@ -0,0 +1,121 @@
+# Standard libs
+import mimetypes
+import os
+import threading
+from urllib.parse import unquote, urlparse
+import requests
+
+# Django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.utils._os import safe_join
+from django.utils.module_loading import import_string
+
+
+class PDFRenderError(Exception):
+    pass
+
+
+class BasePDFRenderer:
+    """
+    Converts rendered HTML into PDF bytes.
+
+    Subclasses implement convert(); render() wraps it in a bounded semaphore so
+    at most max_concurrency conversions run at once per process.
+    """
+
+    def __init__(self, max_concurrency=2, timeout=60):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def render(self, html, filename="report", page_size="A3", landscape=True, base_url=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PDFRenderError("Timed out waiting for a free PDF renderer.")
+        try:
+            return self.convert(html, filename=filename, page_size=page_size, landscape=landscape, base_url=base_url)
+        finally:
+            self._slots.release()
+
+    def convert(self, html, filename, page_size, landscape, base_url):
+        raise NotImplementedError
+
+
+class WeasyPrintRenderer(BasePDFRenderer):
+    """Renders in-process with WeasyPrint, resolving media files from local storage."""
+
+    def __init__(self, **kwargs):
+        try:
+            import weasyprint
+        except (ImportError, OSError) as e:
+            raise ImproperlyConfigured(f"WeasyPrintRenderer requires the 'weasyprint' package and its system libraries: {e}") from e
+
+        self._weasyprint = weasyprint
+        super().__init__(**kwargs)
+
+    def fetch_url(self, url, *args, **kwargs):
+        path = unquote(urlparse(url).path)
+        if path.startswith(settings.MEDIA_URL):
+            try:
+                file_path = safe_join(settings.MEDIA_ROOT, path[len(settings.MEDIA_URL):])
+            except SuspiciousFileOperation as e:
+                raise PDFRenderError(f"Refusing to read {url} outside MEDIA_ROOT.") from e
+            if os.path.isfile(file_path):
+                with open(file_path, 'rb') as f:
+                    return {'string': f.read(), 'mime_type': mimetypes.guess_type(file_path)[0], 'filename': file_path}
+        return self._weasyprint.default_url_fetcher(url, *args, **kwargs)
+
+    def convert(self, html, filename, page_size, landscape, base_url):
+        orientation = "landscape" if landscape else "portrait"
+        page_css = self._weasyprint.CSS(string=f"@page {{ size: {page_size} {orientation}; margin: 0; }}")
+
+        try:
+            document = self._weasyprint.HTML(string=html, base_url=base_url, url_fetcher=self.fetch_url)
+            return document.write_pdf(stylesheets=[page_css])
+        except Exception as e:
+            raise PDFRenderError(f"PDF conversion failed: {e}") from e
+
+
+class RemotePDFRenderer(BasePDFRenderer):
+    """Posts the HTML to the html2pdf.fly.dev conversion API."""
+
+    api_url = "https://html2pdf.fly.dev/api/generate"
+
+    def convert(self, html, filename, page_size, landscape, base_url):
+        try:
+            response = requests.post(
+                self.api_url,
+                json={
+                    "html": html,
+                    "format": page_size,
+                    "landscape": landscape,
+                    "filename": filename,
+                    "printBackground": True
+                },
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise PDFRenderError(f"PDF conversion failed: {e}") from e
+
+        if response.status_code != 200:
+            raise PDFRenderError("PDF conversion failed")
+
+        return response.content
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+def get_pdf_renderer():
+    """Return the process-wide renderer configured by settings.PDF_RENDERER."""
+    global _renderer
+
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                backend = import_string(getattr(settings, 'PDF_RENDERER', 'teams.pdf.WeasyPrintRenderer'))
+                _renderer = backend(
+                    max_concurrency=getattr(settings, 'PDF_RENDERER_MAX_CONCURRENCY', 2),
+                    timeout=getattr(settings, 'PDF_RENDERER_TIMEOUT', 60),
+                )
+    return _renderer
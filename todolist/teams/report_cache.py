@@ -0,0 +1,90 @@
+# Standard libs
+from datetime import timedelta
+import hashlib
+import os
+
+# Django
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+# Local apps
+from timetracker.aggregates import local_day_bounds
+from timetracker.models import DailyProjectTime, TimeEntry
+
+
+CACHE_DIR = os.path.join('tmp', 'reports', 'cache')
+
+# Bump when the report layout changes so previously cached artifacts are not served.
+CACHE_VERSION = 2
+
+def get_data_fingerprint(project, start_date, end_date):
+    """
+    Fingerprint of everything a report shows besides its parameters: the project's DailyProjectTime
+    rows in the range (what the reports read), the company's employees (names and job titles) and
+    the company logo.
+
+    Returns None while a timer on the project that can reach the range is running, since the
+    report then changes every second and must not be cached.
+    """
+    # Entries are rolled up in their own timezone, so a day of slack covers any viewer's range.
+    _, range_end = local_day_bounds(start_date, end_date)
+    if TimeEntry.objects.running().filter(project=project, start_time__lt=range_end + timedelta(days=1)).exists():
+        return None
+
+    rows = (
+        DailyProjectTime.objects
+        .filter(project=project, date__gte=start_date, date__lte=end_date)
+        .order_by('user_id', 'date')
+        .values_list('user_id', 'date', 'seconds')
+    )
+    digest = hashlib.sha256(repr(list(rows)).encode())
+    return f"{digest.hexdigest()}:{get_company_fingerprint(project.company)}"
+
+def get_company_fingerprint(company):
+    """Digest of the employee names, job titles and logo that reports render, in one query."""
+    if company is None:
+        return ''
+
+    employees = company.employees.order_by('id').values_list('id', 'first_name', 'last_name', 'job_title__name')
+    digest = hashlib.sha256(repr((company.logo.name if company.logo else '', list(employees))).encode())
+    return digest.hexdigest()
+
+def report_cache_path(project, report_type, start_date, end_date, filename, data_start=None, data_end=None):
+    """
+    Storage path of the cached artifact, derived from the report parameters and data fingerprint.
+
+    data_start/data_end cover the entries the report reads when that differs from its labelled range.
+    Returns None if the report cannot be cached right now.
+    """
+    fingerprint = get_data_fingerprint(project, data_start or start_date, data_end or end_date)
+    if fingerprint is None:
+        return None
+
+    key = "|".join(str(part) for part in (
+        CACHE_VERSION,
+        project.id,
+        project.title,
+        report_type,
+        start_date,
+        end_date,
+        timezone.get_current_timezone_name(),
+        fingerprint,
+    ))
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return os.path.join(CACHE_DIR, digest, filename)
+
+def get_or_build(path, build):
+    """
+    Return an open file with the artifact at path, calling build() and storing its result on a miss.
+
+    build must return a django File; a None path skips the cache entirely.
+    """
+    if path is None:
+        return build()
+
+    if not default_storage.exists(path):
+        content = build()
+        with content:
+            path = default_storage.save(path, content)
+
+    return default_storage.open(path, 'rb')
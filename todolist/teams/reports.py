@@ -0,0 +1,245 @@
+# Standard libs
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import os
+import tempfile
+
+# Django
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+# Third-party
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+# Local apps
+from teams.pdf import get_pdf_renderer
+from teams.report_cache import get_or_build, report_cache_path
+from timetracker.models import DailyProjectTime
+
+
+REPORTS_DIR = os.path.join('tmp', 'reports')
+
+def seconds_to_hm(seconds):
+    if seconds <= 60 * 15:
+        return "—"
+
+    rounded_hours = round((seconds / 3600) * 2) / 2
+
+    hours = int(rounded_hours)
+    minutes = int((rounded_hours - hours) * 60)
+
+    return f"{hours:02d}:{minutes:02d}"
+
+def round_to_half_hour(hours_float):
+    return round(hours_float * 2) / 2
+
+def split_into_weeks(start_date, end_date):
+    weeks = []
+    current = start_date
+    while current <= end_date:
+        weeks.append((current, min(current + timedelta(days=6), end_date)))
+        current += timedelta(days=7)
+    return weeks
+
+def weekly_report_filename(project, start_of_week, end_of_week):
+    return f"TimeReport_{project.title}_Week-{start_of_week.isocalendar().week}_{start_of_week.strftime('%d.%m.%Y')}-{end_of_week.strftime('%d.%m.%Y')}.pdf"
+
+def get_project_daily_time(project, start_date, end_date):
+    rows = DailyProjectTime.objects.daily_totals(start_date, end_date, 'user_id', project=project)
+    return {(row['user_id'], row['day']): row['total'].total_seconds() for row in rows}
+
+def get_weekly_report_context(project, start_of_week, end_of_week, daily_time=None, employees=None):
+    week_dates = [start_of_week + timedelta(days=i) for i in range(7)]
+
+    if daily_time is None:
+        daily_time = get_project_daily_time(project, week_dates[0], week_dates[-1])
+    if employees is None:
+        employees = project.company.employees.all()
+
+    employee_data = []
+    totals_by_day = [0] * 7
+    grand_total = 0
+
+    for employee in employees:
+        daily_seconds = [daily_time.get((employee.id, current_date), 0) for current_date in week_dates]
+        employee_total = sum(daily_seconds)
+        if employee_total == 0:
+            continue
+
+        for i, total_seconds in enumerate(daily_seconds):
+            totals_by_day[i] += total_seconds
+
+        employee_data.append({
+            "employee_name": employee.get_full_name(),
+            "employee_times": [seconds_to_hm(s) for s in daily_seconds],
+            "employee_total": seconds_to_hm(employee_total)
+        })
+        grand_total += employee_total
+
+    return {
+        'project': project,
+        'week_dates': week_dates,
+        'project_row': [seconds_to_hm(s) for s in totals_by_day],
+        'project_total': seconds_to_hm(grand_total),
+        'employee_data': employee_data,
+        'start_date': start_of_week.strftime('%d/%m/%y'),
+        'end_date': end_of_week.strftime('%d/%m/%y'),
+    }
+
+def get_weekly_report_html(project, start_of_week, end_of_week, base_url, daily_time=None, employees=None):
+    context = get_weekly_report_context(project, start_of_week, end_of_week, daily_time, employees)
+    context['base_url'] = base_url.rstrip('/')
+    return render_to_string('teams/project_weekly_report.html', context)
+
+def render_weekly_pdf_bytes(project, start_of_week, end_of_week, base_url):
+    html = get_weekly_report_html(project, start_of_week, end_of_week, base_url)
+    return get_pdf_renderer().render(html, filename=f"week_{start_of_week.isocalendar().week}", base_url=base_url)
+
+def weekly_pdf_cache_path(project, start_of_week, end_of_week):
+    return report_cache_path(
+        project,
+        'weekly_pdf',
+        start_of_week,
+        end_of_week,
+        weekly_report_filename(project, start_of_week, end_of_week),
+        data_end=start_of_week + timedelta(days=6)
+    )
+
+def render_weekly_pdf(project, start_of_week, end_of_week, base_url):
+    """Return an open file with the weekly PDF, reusing the cached artifact while the data is unchanged."""
+    return get_or_build(
+        weekly_pdf_cache_path(project, start_of_week, end_of_week),
+        lambda: ContentFile(render_weekly_pdf_bytes(project, start_of_week, end_of_week, base_url))
+    )
+
+def render_monthly_pdfs(project, start_date, end_date, base_url):
+    """Render one PDF per week of the range, returning (filename, file) pairs; cached weeks are reused."""
+    weeks = split_into_weeks(start_date, end_date)
+    cache_paths = [weekly_pdf_cache_path(project, *week) for week in weeks]
+    missing = [
+        week for week, path in zip(weeks, cache_paths)
+        if path is None or not default_storage.exists(path)
+    ]
+
+    rendered = {}
+    if missing:
+        daily_time = get_project_daily_time(project, missing[0][0], missing[-1][0] + timedelta(days=6))
+        employees = list(project.company.employees.all())
+
+        html_by_week = [
+            get_weekly_report_html(project, start_of_week, end_of_week, base_url, daily_time, employees)
+            for start_of_week, end_of_week in missing
+        ]
+
+        renderer = get_pdf_renderer()
+
+        def render_week(week, html):
+            return renderer.render(html, filename=f"week_{week[0].isocalendar().week}", base_url=base_url)
+
+        with ThreadPoolExecutor(max_workers=renderer.max_concurrency) as executor:
+            rendered = dict(zip(missing, executor.map(render_week, missing, html_by_week)))
+
+    def build(week):
+        if week not in rendered:
+            rendered[week] = render_weekly_pdf_bytes(project, *week, base_url)
+        return ContentFile(rendered[week])
+
+    return [
+        (weekly_report_filename(project, *week), get_or_build(path, lambda week=week: build(week)))
+        for week, path in zip(weeks, cache_paths)
+    ]
+
+def get_job_title_week_totals(project, start_date, end_date):
+    """Tracked time on the project per (ISO year, ISO week, job title), summed from the daily rollup."""
+    totals = defaultdict(timedelta)
+    rows = DailyProjectTime.objects.daily_totals(
+        start_date,
+        end_date,
+        'user__job_title__name',
+        project=project,
+        user__company=project.company
+    )
+    for row in rows:
+        iso_year, week, _ = row['day'].isocalendar()
+        totals[(iso_year, week, row['user__job_title__name'] or 'Unknown')] += row['total']
+
+    return [
+        {'iso_year': iso_year, 'week': week, 'job_title': job_title, 'total': total}
+        for (iso_year, week, job_title), total in sorted(totals.items())
+    ]
+
+def monthly_xlsx_filename(project, start_of_month, end_of_month):
+    return f"TimeReport_{project.title}_{start_of_month.strftime('%d.%m.%Y')}-{end_of_month.strftime('%d.%m.%Y')}.xlsx"
+
+def write_monthly_xlsx(project, start_of_month, end_of_month, output):
+    """Write the job title / ISO week summary into output using a write-only workbook."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Monthly Report")
+
+    ws.column_dimensions['A'].width = 45
+    ws.column_dimensions['B'].width = 30
+
+    header = []
+    for title in ("Job Title - Project | Week", "Total Time"):
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+
+    for row in get_job_title_week_totals(project, start_of_month, end_of_month):
+        total_seconds = row['total'].total_seconds()
+        if total_seconds <= 0:
+            continue
+
+        rounded_hours = round_to_half_hour(total_seconds / 3600)
+        label = f"{row['job_title']} - {project.title} | week {row['week']}"
+        ws.append([label, f"{rounded_hours:.1f}"])
+
+    ws.append([""])
+    ws.append(["Period", f"{start_of_month.strftime('%d/%m/%Y')} - {end_of_month.strftime('%d/%m/%Y')}"])
+
+    wb.save(output)
+
+def build_monthly_xlsx(project, start_of_month, end_of_month):
+    """Write the summary workbook to a temporary file positioned at the start."""
+    output = tempfile.TemporaryFile()
+    write_monthly_xlsx(project, start_of_month, end_of_month, output)
+    output.seek(0)
+    return File(output)
+
+def get_monthly_xlsx(project, start_of_month, end_of_month):
+    """Return (filename, open file) for the summary workbook, reusing the cached artifact while the data is unchanged."""
+    filename = monthly_xlsx_filename(project, start_of_month, end_of_month)
+    path = report_cache_path(project, 'monthly_xlsx', start_of_month, end_of_month, filename)
+    return filename, get_or_build(path, lambda: build_monthly_xlsx(project, start_of_month, end_of_month))
+
+def iter_file(file, chunk_size=64 * 1024):
+    with file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def run_report_job(job, base_url):
+    """Generate the artifacts of a claimed ReportJob and store them under media/tmp/reports."""
+    with timezone.override(job.timezone):
+        if job.report_type == 'monthly_pdf':
+            artifacts = render_monthly_pdfs(job.project, job.start_date, job.end_date, base_url)
+        elif job.report_type == 'monthly_xlsx':
+            artifacts = [get_monthly_xlsx(job.project, job.start_date, job.end_date)]
+        else:
+            raise ValueError(f"Unknown report type: {job.report_type}")
+
+    files = []
+    for filename, content in sorted(artifacts, key=lambda artifact: artifact[0]):
+        path = os.path.join(REPORTS_DIR, f"job_{job.id}", filename)
+        with content:
+            files.append(default_storage.save(path, content))
+
+    return files
@@ -0,0 +1,130 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from main.models import Project, Task
+from timetracker.models import TimeEntry
+from timetracker.signals import entry_state
+
+from .analytics_cache import invalidate_company_projects, invalidate_company_time, invalidate_user_projects, invalidate_users
+from .context_processors import invalidate_company_navigation, invalidate_user_navigation
+from .models import Holiday, JoinRequest
+
+
+def time_entry_state(state):
+    """The part of timetracker.signals.entry_state() the analytics caches depend on."""
+    return state and {key: state[key] for key in ('user_id', 'project_id', 'company_id', 'start_time', 'end_time')}
+
+@receiver(post_save, sender=TimeEntry)
+def invalidate_time_entry_analytics(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    # Read by timetracker's pre_save handler, so the stored row is only fetched once per save.
+    previous = time_entry_state(getattr(instance, '_previous_state', None))
+    current = time_entry_state(entry_state(instance))
+    if previous == current:
+        return
+
+    states = [state for state in (previous, current) if state]
+    invalidate_company_time(*(state['company_id'] for state in states))
+    invalidate_users(*(state['user_id'] for state in states))
+
+@receiver(post_delete, sender=TimeEntry)
+def invalidate_deleted_time_entry_analytics(sender, instance, **kwargs):
+    invalidate_company_time(instance.project.company_id if instance.project_id else None)
+    invalidate_users(instance.user_id)
+
+
+def task_state(task):
+    return {
+        'user_id': task.user_id,
+        'project_id': task.project_id,
+        'completed_at': task.completed_at,
+    }
+
+@receiver(pre_save, sender=Task)
+def remember_task_state(sender, instance, raw=False, **kwargs):
+    instance._analytics_previous = None
+    if raw or not instance.pk:
+        return
+
+    instance._analytics_previous = (
+        Task.objects.filter(pk=instance.pk).values('user_id', 'project_id', 'completed_at').first()
+    )
+
+@receiver(post_save, sender=Task)
+def invalidate_task_analytics(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_analytics_previous', None)
+    current = task_state(instance)
+    if previous == current:
+        return
+
+    # Only completed tasks are counted, so changes to open tasks never affect analytics.
+    states = [state for state in (previous, current) if state and state['completed_at']]
+    invalidate_users(*(state['user_id'] for state in states))
+
+@receiver(post_delete, sender=Task)
+def invalidate_deleted_task_analytics(sender, instance, **kwargs):
+    if instance.completed_at:
+        invalidate_users(instance.user_id)
+
+
+@receiver(pre_save, sender=Project)
+def remember_project_state(sender, instance, raw=False, **kwargs):
+    instance._analytics_previous = None
+    if raw or not instance.pk:
+        return
+
+    instance._analytics_previous = (
+        Project.objects.filter(pk=instance.pk).values('title', 'color', 'client', 'company_id', 'created_by_id').first()
+    )
+
+@receiver(post_save, sender=Project)
+def invalidate_project_analytics(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_analytics_previous', None)
+    if raw or created or not previous:
+        return
+
+    current = {
+        'title': instance.title,
+        'color': instance.color,
+        'client': instance.client,
+        'company_id': instance.company_id,
+        'created_by_id': instance.created_by_id,
+    }
+    if previous != current:
+        invalidate_company_projects(previous['company_id'], instance.company_id)
+        # Personal projects have no company key; their creator's timesheets depend on them.
+        invalidate_user_projects(*(
+            state['created_by_id'] for state in (previous, current) if not state['company_id']
+        ))
+
+@receiver(post_delete, sender=Project)
+def invalidate_deleted_project_analytics(sender, instance, **kwargs):
+    # Time entries and tasks are detached with SET_NULL, which bypasses their own signals.
+    invalidate_company_projects(instance.company_id)
+    if not instance.company_id:
+        invalidate_user_projects(instance.created_by_id)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_navigation(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_analytics_previous', None) or {}
+    invalidate_company_navigation(instance.company_id, previous.get('company_id'))
+    if not instance.company_id or not previous.get('company_id'):
+        invalidate_user_navigation(instance.created_by_id)
+
+@receiver(post_save, sender=Holiday)
+@receiver(post_delete, sender=Holiday)
+@receiver(post_save, sender=JoinRequest)
+@receiver(post_delete, sender=JoinRequest)
+def invalidate_request_navigation(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_company_navigation(instance.company_id)
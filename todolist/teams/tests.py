@@ -1,3 +1,606 @@
-from django.test import TestCase
+# Standard libs
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from smtplib import SMTPException
+from unittest import mock
+import json
+import shutil
+import tempfile
 
-# Create your tests here.
+# Django
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+# Third-party
+import openpyxl
+
+# Local apps
+from main.models import Project
+from teams.admin import HolidayAdmin
+from teams.context_processors import get_navigation
+from teams.management.commands.run_report_jobs import Command as RunReportJobsCommand, STALE_JOB_AFTER, fail_stale_jobs
+from teams.mail import claim_batch, enqueue_email, retry_delay, send_batch, STALE_CLAIM_AFTER
+from teams.models import Company, Holiday, HolidayBalance, HolidayLedgerEntry, JobTitle, JoinRequest, OutboundEmail, ReportJob
+from teams.pdf import BasePDFRenderer
+from teams.report_cache import report_cache_path
+from teams.reports import get_weekly_report_context, get_weekly_report_html, render_monthly_pdfs, write_monthly_xlsx
+from teams.views.general import get_company_charts_data
+from teams.working_calendar import WorkingCalendar, count_weekdays
+from timetracker.models import TimeEntry
+
+
+User = get_user_model()
+
+MONDAY = date(2025, 7, 7)
+
+
+class WorkingCalendarTests(TestCase):
+    def test_count_weekdays(self):
+        self.assertEqual(count_weekdays(MONDAY, MONDAY + timedelta(days=6)), 5)
+        self.assertEqual(count_weekdays(MONDAY + timedelta(days=5), MONDAY + timedelta(days=6)), 0)
+        self.assertEqual(count_weekdays(MONDAY + timedelta(days=4), MONDAY + timedelta(days=14)), 7)
+        self.assertEqual(count_weekdays(MONDAY + timedelta(days=1), MONDAY), 0)
+
+    def test_working_days_skip_weekday_bank_holidays(self):
+        calendar = WorkingCalendar([
+            (MONDAY + timedelta(days=2), MONDAY + timedelta(days=2)),
+            (MONDAY + timedelta(days=5), MONDAY + timedelta(days=6)),
+        ])
+
+        self.assertEqual(calendar.count_bank_holidays(MONDAY, MONDAY + timedelta(days=6)), 1)
+        self.assertEqual(calendar.count_working_days(MONDAY, MONDAY + timedelta(days=6)), 4)
+
+    def test_bank_holidays_use_every_weekday(self):
+        calendar = WorkingCalendar([(MONDAY, MONDAY + timedelta(days=4))])
+
+        self.assertEqual(calendar.count_holiday_days('bank_holiday', MONDAY, MONDAY + timedelta(days=4)), 5)
+        self.assertEqual(calendar.count_holiday_days('holiday', MONDAY, MONDAY + timedelta(days=4)), 0)
+
+    def test_for_company_can_ignore_a_bank_holiday(self):
+        company = Company.objects.create(name="Acme")
+        bank_holiday = Holiday.objects.create(
+            company=company, start_date=MONDAY, end_date=MONDAY, type='bank_holiday', status='approved'
+        )
+
+        self.assertEqual(WorkingCalendar.for_company(company.id).count_working_days(MONDAY, MONDAY), 0)
+        self.assertEqual(WorkingCalendar.for_company(company.id, exclude_ids=[bank_holiday.id]).count_working_days(MONDAY, MONDAY), 1)
+
+
+class HolidayLedgerTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name="Acme")
+        self.user = User.objects.create_user(email="employee@example.com", company=self.company)
+        self.holiday = Holiday.objects.create(
+            company=self.company, start_date=MONDAY, end_date=MONDAY + timedelta(days=4), type='holiday'
+        )
+
+    def record(self, *days):
+        user, = HolidayBalance.objects.lock([self.user], [MONDAY.year])
+        return HolidayLedgerEntry.objects.record([
+            HolidayLedgerEntry.for_holiday(self.holiday, user.id, value) for value in days
+        ])
+
+    def used_holidays(self):
+        return User.objects.get(id=self.user.id).used_holidays
+
+    def test_record_nets_entries_and_updates_the_balance(self):
+        entries = self.record(5, -2)
+
+        self.assertEqual([(entry.days, entry.kind) for entry in entries], [(3, 'charge')])
+        self.assertEqual(HolidayBalance.objects.used_days(self.user, MONDAY.year), 3)
+        self.assertEqual(self.used_holidays(), 3)
+
+    def test_zero_day_changes_are_not_recorded(self):
+        self.assertEqual(self.record(2, -2), [])
+        self.assertFalse(HolidayLedgerEntry.objects.exists())
+
+    def test_legacy_figure_is_opened_before_the_first_charge(self):
+        User.objects.filter(id=self.user.id).update(opening_used_holidays=10)
+        self.assertEqual(self.used_holidays(), 10)
+
+        self.record(3)
+
+        self.assertEqual(self.used_holidays(), 13)
+        self.assertEqual(HolidayLedgerEntry.objects.filter(user=self.user, kind='opening').get().days, 10)
+
+    def test_reset_zeroes_every_year(self):
+        self.record(3)
+        HolidayLedgerEntry.objects.record([
+            HolidayLedgerEntry.for_holiday(self.holiday, self.user.id, 2, date(MONDAY.year + 1, 1, 5))
+        ])
+
+        HolidayLedgerEntry.objects.reset(self.user)
+
+        self.assertEqual(self.used_holidays(), 0)
+        self.assertFalse(HolidayBalance.objects.filter(user=self.user).exclude(used_days=0).exists())
+
+    def test_entries_are_append_only(self):
+        entry, = self.record(1)
+        entry.days = 5
+
+        with self.assertRaises(ValueError):
+            entry.save()
+
+    def test_refunds_follow_the_charged_leave_years(self):
+        self.record(3)
+        HolidayLedgerEntry.objects.record([
+            HolidayLedgerEntry.for_holiday(self.holiday, self.user.id, 2, date(MONDAY.year + 1, 1, 5))
+        ])
+
+        refunds = HolidayLedgerEntry.objects.refunds(self.holiday)
+
+        self.assertEqual(
+            sorted((entry.leave_year, entry.days) for entry in refunds),
+            [(MONDAY.year, -3), (MONDAY.year + 1, -2)]
+        )
+        self.assertEqual(HolidayLedgerEntry.objects.charged_days(self.holiday), {self.user.id: 5})
+
+
+class HolidayRefundTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name="Acme")
+        self.employer = User.objects.create_user(email="employer@example.com", company=self.company, role='employer')
+        self.employee = User.objects.create_user(email="employee@example.com", company=self.company)
+        self.client.force_login(self.employer)
+
+    def request(self, method, url, data):
+        return getattr(self.client, method)(url, json.dumps(data), content_type='application/json')
+
+    def create_holiday(self, holiday_type, start_date, end_date, employees):
+        return self.request('post', reverse('teams:create_holiday'), {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'type': holiday_type,
+            'employees': [employee.id for employee in employees],
+        })
+
+    def used_holidays(self):
+        return User.objects.get(id=self.employee.id).used_holidays
+
+    def test_delete_refunds_the_charged_days_after_a_new_bank_holiday(self):
+        response = self.create_holiday('holiday', MONDAY, MONDAY + timedelta(days=4), [self.employee])
+        holiday_id = response.json()['ids'][0]
+        self.assertEqual(self.used_holidays(), 5)
+
+        # A bank holiday inside the charged week would make a recount return only 4 days.
+        self.create_holiday('bank_holiday', MONDAY + timedelta(days=2), MONDAY + timedelta(days=2), [self.employer])
+
+        self.request('delete', reverse('teams:delete_holiday', args=[holiday_id]), {})
+        self.assertEqual(self.used_holidays(), 0)
+
+    def test_edit_charges_only_the_difference(self):
+        response = self.create_holiday('holiday', MONDAY, MONDAY + timedelta(days=4), [self.employee])
+        holiday_id = response.json()['ids'][0]
+
+        self.request('patch', reverse('teams:edit_holiday', args=[holiday_id]), {
+            'start_date': MONDAY.isoformat(),
+            'end_date': (MONDAY + timedelta(days=1)).isoformat(),
+            'type': 'holiday',
+        })
+
+        self.assertEqual(self.used_holidays(), 2)
+
+    def test_declined_request_refunds_after_a_removed_bank_holiday(self):
+        bank_holiday = self.create_holiday('bank_holiday', MONDAY, MONDAY, [self.employer]).json()['id']
+        self.client.force_login(self.employee)
+        holiday_id = self.create_holiday('holiday', MONDAY, MONDAY + timedelta(days=4), []).json()['ids'][0]
+        self.assertEqual(self.used_holidays(), 4)
+
+        self.client.force_login(self.employer)
+        Holiday.objects.filter(id=bank_holiday).delete()
+        self.request('patch', reverse('teams:process_holiday', args=[holiday_id]), {'action': 'decline'})
+
+        self.assertEqual(self.used_holidays(), 0)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise SMTPException("Connection refused")
+
+
+@override_settings(
+    OUTBOUND_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    OUTBOUND_EMAIL_MAX_ATTEMPTS=3,
+    OUTBOUND_EMAIL_RETRY_DELAY=60,
+    OUTBOUND_EMAIL_RATE_LIMIT=0,
+)
+class MailQueueTests(TestCase):
+    def setUp(self):
+        self.email = enqueue_email("Subject", "Body", ["someone@example.com"])
+
+    def test_sends_due_emails(self):
+        sent, failed = send_batch(claim_batch(10))
+
+        self.assertEqual((sent, failed), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts, self.email.claim_token), ('sent', 1, ''))
+
+    def test_failures_are_retried_with_backoff(self):
+        started = timezone.now()
+        sent, failed = send_batch(claim_batch(10), connection=FailingEmailBackend())
+
+        self.assertEqual((sent, failed), (0, 1))
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), ('pending', 1))
+        self.assertIn("Connection refused", self.email.last_error)
+        self.assertGreaterEqual(self.email.next_attempt_at, started + timedelta(seconds=60))
+        self.assertEqual(claim_batch(10), [])
+
+    def test_retry_delay_doubles_up_to_a_cap(self):
+        self.assertEqual(retry_delay(1), timedelta(seconds=60))
+        self.assertEqual(retry_delay(3), timedelta(seconds=240))
+        self.assertEqual(retry_delay(20), timedelta(hours=6))
+
+    def test_gives_up_after_the_last_attempt(self):
+        OutboundEmail.objects.filter(id=self.email.id).update(attempts=2)
+
+        send_batch(claim_batch(10), connection=FailingEmailBackend())
+
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), ('failed', 3))
+
+    def test_stale_claims_are_reclaimed(self):
+        claim_batch(10)
+        self.assertEqual(claim_batch(10), [])
+
+        OutboundEmail.objects.filter(id=self.email.id).update(claimed_at=timezone.now() - STALE_CLAIM_AFTER - timedelta(seconds=1))
+
+        self.assertEqual([email.id for email in claim_batch(10)], [self.email.id])
+
+    def test_reclaimed_emails_are_neither_sent_nor_overwritten(self):
+        emails = claim_batch(10)
+        OutboundEmail.objects.filter(id=self.email.id).update(claim_token='other-worker')
+
+        self.assertEqual(send_batch(emails), (0, 0))
+        self.assertEqual(mail.outbox, [])
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.claim_token), ('sending', 'other-worker'))
+
+
+class ReportCacheTests(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name="Acme")
+        self.user = User.objects.create_user(email="employee@example.com", company=company)
+        self.project = Project.objects.create(title="Website", company=company)
+
+    def cache_path(self):
+        return report_cache_path(self.project, 'weekly_pdf', MONDAY, MONDAY + timedelta(days=6), 'week.pdf')
+
+    def test_editing_an_entry_that_started_before_the_range_changes_the_path(self):
+        sunday_night = datetime(2025, 7, 6, 23, tzinfo=dt_timezone.utc)
+        entry = TimeEntry.objects.create(
+            user=self.user, project=self.project, name="Deploy",
+            start_time=sunday_night, end_time=sunday_night + timedelta(hours=4), timezone='UTC'
+        )
+        with timezone.override('UTC'):
+            before = self.cache_path()
+
+            entry.end_time = sunday_night + timedelta(hours=6)
+            entry.save()
+
+            self.assertNotEqual(self.cache_path(), before)
+
+    def test_reports_are_not_cached_while_a_timer_that_reaches_the_range_runs(self):
+        start_time = datetime(2025, 7, 1, 9, tzinfo=dt_timezone.utc)
+        TimeEntry.objects.create(user=self.user, project=self.project, name="Deploy", start_time=start_time)
+
+        self.assertIsNone(self.cache_path())
+
+
+class WeeklyReportTemplateTests(TestCase):
+    def test_renders_without_external_resources(self):
+        company = Company.objects.create(name="Acme")
+        user = User.objects.create_user(email="employee@example.com", first_name="Ada", company=company)
+        project = Project.objects.create(title="Website", company=company)
+        start_time = datetime(2025, 7, 8, 9, tzinfo=dt_timezone.utc)
+        TimeEntry.objects.create(user=user, project=project, name="Build", start_time=start_time, end_time=start_time + timedelta(hours=2))
+
+        html = get_weekly_report_html(project, MONDAY, MONDAY + timedelta(days=6), 'https://example.com/')
+
+        self.assertNotIn('<link', html)
+        self.assertIn('Ada', html)
+        self.assertIn('02:00', html)
+
+
+class PendingHolidayCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name="Acme")
+        self.employer = User.objects.create_user(email="employer@example.com", company=self.company, role='employer')
+
+    def create_holiday(self, status='pending'):
+        return Holiday.objects.create(company=self.company, start_date=MONDAY, end_date=MONDAY, status=status)
+
+    def counters(self):
+        company = Company.objects.get(id=self.company.id)
+        return (company.pending_holidays_count, company.pending_edit_holidays_count, company.pending_delete_holidays_count)
+
+    def test_counters_follow_status_changes(self):
+        holiday = self.create_holiday()
+        self.assertEqual(self.counters(), (1, 0, 0))
+
+        holiday.status = 'pending_edit'
+        holiday.save()
+        self.assertEqual(self.counters(), (0, 1, 0))
+
+        holiday.status = 'pending_delete'
+        holiday.save(update_fields=['status'])
+        self.assertEqual(self.counters(), (0, 0, 1))
+
+        holiday.delete()
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_stale_holiday_copies_move_the_counter_once(self):
+        holiday = self.create_holiday()
+        self.create_holiday()
+        first, second = Holiday.objects.get(id=holiday.id), Holiday.objects.get(id=holiday.id)
+
+        for copy in (first, second):
+            copy.status = 'approved'
+            copy.save()
+
+        self.assertEqual(self.counters(), (1, 0, 0))
+
+    def test_company_save_keeps_concurrent_counter_changes(self):
+        company = Company.objects.get(id=self.company.id)
+        self.create_holiday()
+
+        company.description = "Updated"
+        company.save()
+
+        self.assertEqual(self.counters(), (1, 0, 0))
+        self.assertEqual(Company.objects.get(id=self.company.id).description, "Updated")
+
+    def test_admin_bulk_delete_updates_the_counters(self):
+        self.create_holiday()
+        self.create_holiday('pending_edit')
+
+        HolidayAdmin(Holiday, admin.site).delete_queryset(None, Holiday.objects.all())
+
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_reconcile_repairs_drift(self):
+        self.create_holiday()
+        Company.objects.filter(id=self.company.id).update(pending_holidays_count=7, pending_delete_holidays_count=2)
+
+        out = StringIO()
+        call_command('reconcile_pending_holidays', '--dry-run', stdout=out)
+        self.assertIn("pending_holidays_count is 7, expected 1", out.getvalue())
+        self.assertEqual(self.counters(), (7, 0, 2))
+
+        call_command('reconcile_pending_holidays', stdout=StringIO())
+        self.assertEqual(self.counters(), (1, 0, 0))
+
+    def test_team_page_and_navigation_read_the_counters(self):
+        holiday = self.create_holiday()
+        holiday.users.add(self.employer)
+        self.create_holiday('pending_delete')
+        self.client.force_login(self.employer)
+
+        response = self.client.get(reverse('teams:team'))
+
+        self.assertEqual(response.context['company'].total_pending_holidays, 2)
+        self.assertEqual(response.context['navigation']['pending_requests'], 2)
+        self.assertEqual([h.id for h in response.context['pending_holidays']], [holiday.id])
+
+
+class ReportJobWorkerTests(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name="Acme")
+        project = Project.objects.create(title="Website", company=company)
+        self.job = ReportJob.objects.create(
+            company=company, project=project, report_type='monthly_pdf', start_date=MONDAY, end_date=MONDAY,
+            status='running', started_at=timezone.now()
+        )
+        self.worker = RunReportJobsCommand(stdout=StringIO(), stderr=StringIO())
+
+    def test_stale_jobs_are_failed(self):
+        ReportJob.objects.filter(id=self.job.id).update(started_at=timezone.now() - STALE_JOB_AFTER - timedelta(minutes=1))
+
+        self.assertEqual(fail_stale_jobs(), 1)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'failed')
+
+    def test_late_result_does_not_overwrite_a_failed_job(self):
+        ReportJob.objects.filter(id=self.job.id).update(status='failed')
+
+        with mock.patch('teams.management.commands.run_report_jobs.run_report_job', return_value=['report.pdf']):
+            self.worker.process(self.job)
+
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.files), ('failed', []))
+        self.assertIn("[DISCARDED]", self.worker.stderr._out.getvalue())
+
+    def test_failures_store_a_generic_error(self):
+        with mock.patch('teams.management.commands.run_report_jobs.run_report_job', side_effect=OSError("/srv/secret/path")):
+            self.worker.process(self.job)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'failed')
+        self.assertNotIn("/srv/secret/path", self.job.error)
+        self.assertIn("/srv/secret/path", self.worker.stderr._out.getvalue())
+
+
+class WeeklyReportContextTests(TestCase):
+    def test_matrix_sums_each_employee_and_day(self):
+        company = Company.objects.create(name="Acme")
+        ada = User.objects.create_user(email="ada@example.com", first_name="Ada", company=company)
+        bob = User.objects.create_user(email="bob@example.com", first_name="Bob", company=company)
+        User.objects.create_user(email="idle@example.com", first_name="Idle", company=company)
+        project = Project.objects.create(title="Website", company=company)
+        for user, day, hours in ((ada, 0, 2), (ada, 0, 1), (ada, 2, 4), (bob, 2, 1)):
+            start_time = datetime(2025, 7, 7 + day, 9, tzinfo=dt_timezone.utc)
+            TimeEntry.objects.create(user=user, project=project, name="Build", start_time=start_time, end_time=start_time + timedelta(hours=hours), timezone='UTC')
+
+        with timezone.override('UTC'):
+            context = get_weekly_report_context(project, MONDAY, MONDAY + timedelta(days=6))
+
+        rows = {row['employee_name']: row for row in context['employee_data']}
+        self.assertEqual(set(rows), {"Ada", "Bob"})
+        self.assertEqual(rows["Ada"]['employee_times'][:3], ["03:00", "—", "04:00"])
+        self.assertEqual(rows["Ada"]['employee_total'], "07:00")
+        self.assertEqual(context['project_row'][2], "05:00")
+        self.assertEqual(context['project_total'], "08:00")
+
+
+class RecordingRenderer(BasePDFRenderer):
+    def __init__(self):
+        super().__init__(max_concurrency=2)
+        self.rendered = []
+
+    def convert(self, html, filename, page_size, landscape, base_url):
+        self.rendered.append(filename)
+        return html.encode()
+
+
+class MonthlyReportTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        company = Company.objects.create(name="Acme")
+        self.user = User.objects.create_user(email="ada@example.com", first_name="Ada", company=company)
+        self.project = Project.objects.create(title="Website", company=company)
+        self.job_title = JobTitle.objects.create(name="Developer", company=company)
+        for day, hours in ((7, 2), (15, 3)):
+            start_time = datetime(2025, 7, day, 9, tzinfo=dt_timezone.utc)
+            TimeEntry.objects.create(user=self.user, project=self.project, name="Build", start_time=start_time, end_time=start_time + timedelta(hours=hours), timezone='UTC')
+
+    def test_pdfs_are_rendered_per_week_and_reused(self):
+        renderer = RecordingRenderer()
+        end_date = MONDAY + timedelta(days=13)
+
+        with timezone.override('UTC'), mock.patch('teams.reports.get_pdf_renderer', return_value=renderer):
+            artifacts = render_monthly_pdfs(self.project, MONDAY, end_date, 'https://example.com/')
+            pages = []
+            for _, content in artifacts:
+                with content:
+                    pages.append(content.read().decode())
+
+            self.assertEqual(len(renderer.rendered), 2)
+            self.assertIn("02:00", pages[0])
+            self.assertIn("03:00", pages[1])
+            self.assertNotIn("03:00", pages[0])
+
+            for _, content in render_monthly_pdfs(self.project, MONDAY, end_date, 'https://example.com/'):
+                content.close()
+            self.assertEqual(len(renderer.rendered), 2)
+
+    def test_xlsx_sums_job_title_time_per_week(self):
+        User.objects.filter(id=self.user.id).update(job_title=self.job_title)
+
+        output = BytesIO()
+        with timezone.override('UTC'):
+            write_monthly_xlsx(self.project, date(2025, 7, 1), date(2025, 7, 31), output)
+
+        rows = list(openpyxl.load_workbook(output).active.iter_rows(values_only=True))
+        self.assertEqual(rows[1:3], [("Developer - Website | week 28", "2.0"), ("Developer - Website | week 29", "3.0")])
+        self.assertEqual(rows[-1], ("Period", "01/07/2025 - 31/07/2025"))
+
+
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name="Acme")
+        self.user = User.objects.create_user(email="ada@example.com", company=self.company)
+        self.project = Project.objects.create(title="Website", company=self.company, color="#FF0000")
+        self.start_time = timezone.now() - timedelta(days=2)
+
+    def add_entry(self, hours):
+        return TimeEntry.objects.create(
+            user=self.user, project=self.project, name="Build",
+            start_time=self.start_time, end_time=self.start_time + timedelta(hours=hours)
+        )
+
+    def test_company_charts_group_time_by_project(self):
+        other = Project.objects.create(title="App", company=self.company, color="#00FF00")
+        self.add_entry(2)
+        TimeEntry.objects.create(user=self.user, project=other, name="Build", start_time=self.start_time, end_time=self.start_time + timedelta(minutes=30))
+
+        data = get_company_charts_data(self.company, 'allTime')
+
+        donut = data['donut_chart_data']
+        self.assertEqual(dict(zip(donut['labels'], donut['datasets'][0]['data'])), {"Website": 2, "App": 0.5})
+        self.assertEqual(data['total_time'], "2h 30m 0s")
+
+    def test_company_charts_are_recomputed_once_a_change_commits(self):
+        self.add_entry(1)
+        self.assertEqual(get_company_charts_data(self.company, 'allTime')['total_time'], "1h 0m 0s")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.add_entry(2)
+        # Until the change commits, the old token keeps serving the cached result.
+        self.assertEqual(get_company_charts_data(self.company, 'allTime')['total_time'], "1h 0m 0s")
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_company_charts_data(self.company, 'allTime')['total_time'], "3h 0m 0s")
+
+    def test_cached_charts_include_a_running_timer_on_every_read(self):
+        self.add_entry(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeEntry.objects.create(user=self.user, project=self.project, name="Build", start_time=timezone.now() - timedelta(hours=1))
+        self.assertTrue(get_company_charts_data(self.company, 'allTime')['total_time'].startswith("2h 0m"))
+
+        later = timezone.now() + timedelta(hours=1)
+        with mock.patch('teams.views.general.get_company_time_data') as compute, mock.patch('django.utils.timezone.now', return_value=later):
+            total_time = get_company_charts_data(self.company, 'allTime')['total_time']
+        self.assertFalse(compute.called)
+        self.assertTrue(total_time.startswith("3h 0m"))
+
+    def test_navigation_lists_accessible_projects_and_follows_changes(self):
+        User.objects.filter(id=self.user.id).update(role='employer')
+        employer = User.objects.get(id=self.user.id)
+        Project.objects.create(title="Private", created_by=employer)
+        self.assertEqual({project['title'] for project in get_navigation(employer)['projects']}, {"Website", "Private"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Project.objects.create(title="App", company=self.company)
+            JoinRequest.objects.create(company=self.company)
+
+        navigation = get_navigation(employer)
+        self.assertEqual({project['title'] for project in navigation['projects']}, {"Website", "Private", "App"})
+        self.assertEqual(navigation['pending_requests'], 1)
+
+
+class CalendarEventsTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name="Acme")
+        self.user = User.objects.create_user(email="ada@example.com", first_name="Ada", company=self.company)
+        self.client.force_login(self.user)
+
+    def create_holiday(self, start_date, end_date, status='approved'):
+        holiday = Holiday.objects.create(company=self.company, start_date=start_date, end_date=end_date, type='holiday', status=status)
+        holiday.users.add(self.user)
+        return holiday
+
+    def test_returns_the_holidays_overlapping_the_window(self):
+        week = self.create_holiday(MONDAY, MONDAY + timedelta(days=6))
+        pending = self.create_holiday(date(2025, 7, 31), date(2025, 8, 1), status='pending')
+        self.create_holiday(date(2025, 6, 2), date(2025, 6, 3))
+        other_company = Company.objects.create(name="Other")
+        Holiday.objects.create(company=other_company, start_date=MONDAY, end_date=MONDAY)
+
+        response = self.client.get(reverse('teams:calendar_events'), {'start': '2025-07-01', 'end': '2025-08-01T00:00:00'})
+
+        events = {event['id']: event for event in response.json()}
+        self.assertEqual(set(events), {week.id, pending.id})
+        self.assertEqual(events[week.id]['end'], '2025-07-14')
+        self.assertEqual(events[week.id]['extendedProps']['days'], 5)
+        self.assertEqual(events[pending.id]['title'], 'Ada (pending)')
+
+    def test_rejects_a_missing_window(self):
+        response = self.client.get(reverse('teams:calendar_events'), {'start': '2025-07-01'})
+
+        self.assertEqual(response.status_code, 400)
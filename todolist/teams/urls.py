@@ -6,6 +6,7 @@ app_name = 'teams'
 urlpatterns = [
     path('team/', general.team, name='team'),
     path('calendar/', general.calendar, name='calendar'),
+    path('calendar/events/', general.calendar_events, name='calendar_events'),
     
     path("employee/invite/", employee.invite_employee, name="invite_employee"),
     path('employee/<int:employee_id>/assign-task/', employee.assign_task, name='assign_task'),
@@ -24,6 +25,8 @@ urlpatterns = [
     path('project-weekly-report/<int:project_id>/', reports.project_weekly_report, name='project_weekly_report'),
     path('project-monthly-report-pdf/<int:project_id>/', reports.project_monthly_report_pdf, name='project_monthly_report_pdf'),
     path('project-monthly-report-xlsx/<int:project_id>/', reports.project_monthly_report_xlsx, name='project_monthly_report_xlsx'),
+    path('report-job/<int:job_id>/', reports.report_job_status, name='report_job_status'),
+    path('report-job/<int:job_id>/download/<int:index>/', reports.download_report_job, name='download_report_job'),
     
     path('company/create/', company.create_company, name='create_company'),
     path('company/expenses/', company.expenses, name='expenses'),
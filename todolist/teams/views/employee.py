@@ -1,20 +1,20 @@
 # Django
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404, render, redirect
 from django.utils.crypto import get_random_string
-from django.core.mail import EmailMessage
+from django.db import transaction
 from django.views.decorators.http import require_http_methods
 
 # Local apps
 from common.decorators import parse_json_body
 from main.forms import TaskForm
 from main.models import Task
-from teams.models import Document, JobTitle, Invitation
+from teams.models import Document, HolidayLedgerEntry, JobTitle, Invitation
 from teams.decorators import employer_required
+from teams.mail import enqueue_email
 
 
 User = get_user_model()
@@ -43,8 +43,7 @@ def invite_employee(request):
         "If you did not expect this invitation, please ignore this email."
     )
 
-    email_message = EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [email])
-    email_message.send()
+    enqueue_email(subject, message, [email])
     
     # Create and save the invitation
     Invitation.objects.create(
@@ -126,8 +125,9 @@ def employee_detail(request, user_id):
 @require_http_methods(["POST"])
 @login_required
 def kick_employee(request, employee_id):
-    employee = get_object_or_404(User, id=employee_id, company=request.user.company)
-
-    employee.leave_company()
+    with transaction.atomic():
+        employee = get_object_or_404(User, id=employee_id, company=request.user.company)
+        HolidayLedgerEntry.objects.reset(employee)
+        employee.leave_company()
     messages.success(request, f"{employee.get_full_name() } was kicked from the company.")
     return redirect("teams:team")
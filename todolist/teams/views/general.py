@@ -1,23 +1,31 @@
 # Standard libs
 from calendar import monthrange
 from collections import defaultdict
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 import json
 
 # Django
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
 from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_http_methods
 
 # Local apps
-from teams.models import Holiday
+from teams.analytics_cache import cached_company_charts
+from teams.models import Company, Holiday
 from main.forms import ProjectForm, TaskForm
-from timetracker.models import TimeEntry
+from timetracker.models import DailyProjectTime, TimeEntry
 from teams.choices import HOLIDAY_TYPES
 from teams.decorators import employer_required
+from teams.working_calendar import WorkingCalendar
 
 
+User = get_user_model()
+
+CHART_FILTERS = ("week", "lastWeek", "month", "lastMonth", "allTime")
+
 def get_date_range_from_filter(filter_option, all_time_first_entry):
     today = date.today()
 
@@ -40,6 +48,8 @@ def get_date_range_from_filter(filter_option, all_time_first_entry):
         _, last_day = monthrange(start_date.year, start_date.month)
         end_date = start_date.replace(day=last_day)
     elif filter_option == "allTime":
+        if not all_time_first_entry:
+            return None
         start_date = all_time_first_entry.start_time.date()
         end_date = today
     else:
@@ -47,32 +57,49 @@ def get_date_range_from_filter(filter_option, all_time_first_entry):
 
     return start_date, end_date
 
-def process_company_bar_chart(company, start_date, end_date):
-    date_labels = []
-    project_time_by_date = defaultdict(lambda: defaultdict(int))
+COMPANY_TIME_FIELDS = ('project__title', 'project__color')
 
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime("%d/%m/%y")
-        date_labels.append(date_str)
-        
-        for employee in company.employees.all():
-            daily_data = employee.hours_spent_by_projects(current_date, company.projects.all())
-            for project_title, duration in daily_data.items():
-                project_time_by_date[project_title][date_str] += duration
+def get_company_time_data(company, filter_option):
+    """
+    The cacheable part of the company charts: the date range, its rollup rows and the running entries.
 
-        current_date += timedelta(days=1)
+    Running time grows every second, so get_company_charts_data() adds it when reading instead.
+    """
+    all_time_first_entry = (
+        TimeEntry.objects
+        .filter(project__company=company)
+        .order_by('start_time')
+        .first()
+    ) if filter_option == "allTime" else None
 
-    project_titles = list(project_time_by_date.keys())
+    date_range = get_date_range_from_filter(filter_option, all_time_first_entry)
+    if not date_range:
+        return None
 
-    project_color_map = {
-        project.title: project.color
-        for project in company.projects.filter(title__in=project_titles)
+    start_date, end_date = date_range
+    filters = {'project__company': company, 'user__company': company}
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'rows': DailyProjectTime.objects.stopped_totals(start_date, end_date, *COMPANY_TIME_FIELDS, **filters),
+        'running': DailyProjectTime.objects.running_entries(*COMPANY_TIME_FIELDS, **filters),
     }
 
+def process_company_bar_chart(project_time_rows, start_date, end_date, project_color_map):
+    date_labels = []
+    current_date = start_date
+    while current_date <= end_date:
+        date_labels.append(current_date.strftime("%d/%m/%y"))
+        current_date += timedelta(days=1)
+
+    project_time_by_date = defaultdict(lambda: defaultdict(int))
+    for row in project_time_rows:
+        date_str = row['day'].strftime("%d/%m/%y")
+        project_time_by_date[row['project__title']][date_str] += row['total'].total_seconds() / 3600
+
     datasets = []
-    for project_title in project_titles:
-        data = [project_time_by_date[project_title].get(day, 0) for day in date_labels]
+    for project_title, time_by_date in project_time_by_date.items():
+        data = [time_by_date.get(day, 0) for day in date_labels]
         datasets.append({
             "label": project_title,
             "data": data,
@@ -84,25 +111,14 @@ def process_company_bar_chart(company, start_date, end_date):
         "datasets": datasets
     }
 
-def process_company_donut_chart(company, start_date, end_date):
+def process_company_donut_chart(project_time_rows, project_color_map):
     project_time = defaultdict(int)
-
-    current_date = start_date
-    while current_date <= end_date:
-        for employee in company.employees.all():
-            daily_data = employee.hours_spent_by_projects(current_date, company.projects.all())
-            for project_title, duration in daily_data.items():
-                project_time[project_title] += duration
-        current_date += timedelta(days=1)
+    for row in project_time_rows:
+        project_time[row['project__title']] += row['total'].total_seconds() / 3600
 
     labels = list(project_time.keys())
     data = list(project_time.values())
 
-    project_color_map = {
-        project.title: project.color
-        for project in company.projects.filter(title__in=labels)
-    }
-
     datasets = [{
         "data": data,
         "backgroundColor": [project_color_map.get(title, "#000000") for title in labels],
@@ -114,49 +130,49 @@ def process_company_donut_chart(company, start_date, end_date):
         "datasets": datasets
     }
 
-def process_company_charts(request):
-    try:
-        data = json.loads(request.body)
-        filter_option = data.get("filter")
-    except json.JSONDecodeError:
-        return JsonResponse({"success": False, "error": "Invalid JSON"}, status=400)
+def get_company_charts_data(company, filter_option):
+    time_data = cached_company_charts(company, filter_option, lambda: get_company_time_data(company, filter_option))
+    if time_data is None:
+        return None
 
-    all_time_first_entry = (
-        TimeEntry.objects
-        .filter(project__in=request.user.company_projects.all())
-        .order_by('start_time')
-        .first()
+    start_date, end_date = time_data['start_date'], time_data['end_date']
+    project_time_rows = DailyProjectTime.objects.with_running(
+        time_data['rows'], time_data['running'], start_date, end_date, COMPANY_TIME_FIELDS
     )
+    project_color_map = {row['project__title']: row['project__color'] for row in project_time_rows}
 
-    date_range = get_date_range_from_filter(filter_option, all_time_first_entry)
-    if not date_range:
-        return JsonResponse({"success": False, "error": "Invalid filter or no time entries found"}, status=400)
-
-    start_date, end_date = date_range
-    company = request.user.company
-    
-    bar_chart_data = process_company_bar_chart(company, start_date, end_date)
-    donut_chart_data = process_company_donut_chart(company, start_date, end_date)
-    
-    time_entries = TimeEntry.objects.filter(
-        project__in=company.projects.all(),
-        start_time__date__gte=start_date,
-        start_time__date__lte=end_date
-    )
+    bar_chart_data = process_company_bar_chart(project_time_rows, start_date, end_date, project_color_map)
+    donut_chart_data = process_company_donut_chart(project_time_rows, project_color_map)
 
-    total_seconds = int(sum(entry.duration.total_seconds() for entry in time_entries))
+    total_seconds = int(sum(row['total'].total_seconds() for row in project_time_rows))
 
     hours = total_seconds // 3600
     minutes = (total_seconds % 3600) // 60
     seconds = total_seconds % 60
     total_time = f"{hours}h {minutes}m {seconds}s"
-    
-    return JsonResponse({
-        "success": True,
+
+    return {
         "bar_chart_data": bar_chart_data,
         "donut_chart_data": donut_chart_data,
         "total_time": total_time
-    }, status=200)
+    }
+
+def process_company_charts(request):
+    try:
+        data = json.loads(request.body)
+        filter_option = data.get("filter")
+    except json.JSONDecodeError:
+        return JsonResponse({"success": False, "error": "Invalid JSON"}, status=400)
+
+    if filter_option not in CHART_FILTERS:
+        return JsonResponse({"success": False, "error": "Invalid filter or no time entries found"}, status=400)
+
+    company = request.user.company
+    charts_data = get_company_charts_data(company, filter_option)
+    if charts_data is None:
+        return JsonResponse({"success": False, "error": "Invalid filter or no time entries found"}, status=400)
+
+    return JsonResponse({"success": True, **charts_data}, status=200)
 
 @login_required
 @employer_required
@@ -168,10 +184,25 @@ def team(request):
         if request.user.company.projects.exists():
             return process_company_charts(request)
 
+    # Every pending request with its requester, in two queries rather than one per holiday.
+    pending_holidays = defaultdict(list)
+    holidays = (
+        request.user.company.holidays
+        .filter(status__in=Company.PENDING_HOLIDAY_COUNTERS)
+        .prefetch_related(Prefetch('users', queryset=User.objects.order_by('id')))
+    )
+    for holiday in holidays:
+        pending_holidays[holiday.status].append(holiday)
+
     task_form = TaskForm(prefix="task")
     project_form = ProjectForm(prefix="project")
     context = {
         'company': request.user.company,
+        'pending_holidays': pending_holidays['pending'],
+        'pending_edit_holidays': pending_holidays['pending_edit'],
+        'pending_delete_holidays': pending_holidays['pending_delete'],
+        'employees': User.objects.with_presence(request.user.company),
+        'company_projects': list(request.user.company.projects.with_tracked_time()),
         'task_form': task_form,
         'project_form': project_form,
     }
@@ -189,66 +220,95 @@ color_map_others = {
     'sick_day': 'rgba(255, 221, 153, 0.4)',
 }
 
+def parse_calendar_date(value):
+    """Accept the ISO dates or datetimes FullCalendar sends as window bounds."""
+    return datetime.fromisoformat(value).date()
+
+def holiday_to_event(holiday, user, days):
+    users = list(holiday.users.all())
+    is_own = any(holiday_user.id == user.id for holiday_user in users)
+
+    # Title
+    if len(users) == 1:
+        title = users[0].get_full_name()
+        if holiday.status == 'pending':
+            title = f'{title} (pending)'
+        elif holiday.status == 'pending_delete':
+            title = f'{title} (pending delete)'
+        elif holiday.status == 'pending_edit':
+            title = f'{title} (pending edit)'
+    elif is_own:
+        title = f'{user.get_full_name()} and {len(users) - 1} more'
+    elif users:
+        title = f'{users[0].get_full_name()} and {len(users) - 1} more'
+    else:
+        title = holiday.get_type_display()
+
+    # Color
+    if is_own:
+        color = color_map_self.get(holiday.type, '#cccccc')
+    else:
+        color = color_map_others.get(holiday.type, '#cccccc')
+
+    type_display = f"({'paid' if holiday.paid else 'unpaid'}) {holiday.get_type_display()}"
+
+    return {
+        'id': holiday.id,
+        'title': title,
+        'start': str(holiday.start_date),
+        'end': str(holiday.end_date + timedelta(days=1)),
+        'color': color,
+        'textColor': 'black',
+        'extendedProps': {
+            'type': holiday.type,
+            'type_display': type_display,
+            'reason': holiday.reason,
+            'users': ', '.join([holiday_user.get_full_name() for holiday_user in users]),
+            'start_date': holiday.start_date.strftime('%d/%m/%y'),
+            'end_date': holiday.end_date.strftime('%d/%m/%y'),
+            'days': days,
+        }
+    }
+
+@require_http_methods(["GET"])
+@login_required
+def calendar_events(request):
+    try:
+        window_start = parse_calendar_date(request.GET['start'])
+        window_end = parse_calendar_date(request.GET['end'])
+    except (KeyError, ValueError):
+        return JsonResponse({'success': False, 'error': 'start and end must be ISO dates.'}, status=400)
+
+    # FullCalendar's end bound is exclusive.
+    holidays = (
+        Holiday.objects
+        .filter(
+            company_id=request.user.company_id,
+            status__in=['approved', 'pending', 'pending_edit', 'pending_delete'],
+            start_date__lt=window_end,
+            end_date__gte=window_start
+        )
+        .prefetch_related('users')
+    )
+
+    days_by_holiday = WorkingCalendar.for_company(request.user.company_id).count_many(holidays)
+    events = [holiday_to_event(holiday, request.user, days_by_holiday[holiday.id]) for holiday in holidays]
+    return JsonResponse(events, safe=False, status=200)
+
 @login_required
 def calendar(request):
-    holidays = Holiday.objects.filter(company=request.user.company, status__in=['approved', 'pending', 'pending_edit', 'pending_delete'])
+    user_holidays = list(request.user.holidays.all())
 
-    all_holidays = []
-    for holiday in holidays:
-        users = holiday.users.all()
-        
-        # Title
-        if users.count() == 1:
-            title = users.first().get_full_name()
-            if holiday.status == 'pending':
-                title = f'{title} (pending)'
-            elif holiday.status == 'pending_delete':
-                title = f'{title} (pending delete)'
-            elif holiday.status == 'pending_edit':
-                title = f'{title} (pending edit)'
-        elif request.user in users:
-            title = f'{request.user.get_full_name()} and {users.count() - 1} more'
-        else:
-            title = f'{users.first().get_full_name()} and {users.count() - 1} more'
-        
-        # Color
-        if request.user in holiday.users.all():
-            color = color_map_self.get(holiday.type, '#cccccc')
-        else:
-            color = color_map_others.get(holiday.type, '#cccccc')
-        
-        type_display = f"({'paid' if holiday.paid else 'unpaid'}) {holiday.get_type_display()}"
-        
-        all_holidays.append({
-            'id': holiday.id,
-            'title': title,
-            'start': str(holiday.start_date),
-            'end': str(holiday.end_date + timedelta(days=1)),
-            'color': color,
-            'textColor': 'black',
-            'extendedProps': {
-                'type': holiday.type,
-                'type_display': type_display,
-                'reason': holiday.reason,
-                'users': ', '.join([user.get_full_name() for user in holiday.users.all()]),
-                'start_date': holiday.start_date.strftime('%d/%m/%y'),
-                'end_date': holiday.end_date.strftime('%d/%m/%y'),
-                'days': holiday.number_of_days,
-            }
-        })
-    
-    user_holidays = request.user.holidays.all()
-    
-    holidays = [date.strftime('%Y-%m-%d') for event in user_holidays.filter(type='holiday') for date in event.dates]
-    bank_holidays = [date.strftime('%Y-%m-%d') for event in user_holidays.filter(type='bank_holiday') for date in event.dates]
-    sick_days = [date.strftime('%Y-%m-%d') for event in user_holidays.filter(type='sick_day') for date in event.dates]
+    # The year overview draws one range per holiday rather than one entry per day.
+    holiday_ranges = defaultdict(list)
+    for holiday in user_holidays:
+        holiday_ranges[holiday.type].append([str(holiday.start_date), str(holiday.end_date)])
 
     context = {
-        'all_holidays_json': json.dumps(all_holidays, cls=DjangoJSONEncoder),
         'user_holidays': user_holidays,
         'holiday_types': HOLIDAY_TYPES,
-        'holidays': holidays,
-        'bank_holidays': bank_holidays,
-        'sick_days': sick_days
+        'holidays': json.dumps(holiday_ranges['holiday']),
+        'bank_holidays': json.dumps(holiday_ranges['bank_holiday']),
+        'sick_days': json.dumps(holiday_ranges['sick_day'])
     }
     return render(request, 'teams/calendar.html', context)
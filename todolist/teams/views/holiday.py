@@ -1,11 +1,11 @@
 # Standard libs
 from datetime import datetime
-from datetime import timedelta
 
 # Django
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, render
 from django.utils.decorators import method_decorator
@@ -14,10 +14,11 @@ from django.views.decorators.http import require_http_methods
 
 # Local apps
 from teams.decorators import employer_required
-from teams.models import Holiday
+from teams.models import Holiday, HolidayBalance, HolidayLedgerEntry
 from common.decorators import parse_json_body
 from teams.choices import HOLIDAY_TYPES
 from teams.forms import HolidayForm
+from teams.working_calendar import WorkingCalendar
 
 
 User = get_user_model()
@@ -29,19 +30,6 @@ def get_validated_dates(data):
         raise ValueError("Start date must be before end date.")
     return start, end
 
-def calculate_weekdays(start_date, end_date):
-    delta = timedelta(days=1)
-    current = start_date
-    count = 0
-    while current <= end_date:
-        if current.weekday() < 5:
-            count += 1
-        current += delta
-    return count
-
-def get_days_diff(old_start, old_end, new_start, new_end):
-    return calculate_weekdays(new_start, new_end) - calculate_weekdays(old_start, old_end)
-
 class HolidayEditView(LoginRequiredMixin, View):
     def get(self, request, holiday_id):
         holiday = get_object_or_404(Holiday, id=holiday_id, company=request.user.company)
@@ -53,6 +41,7 @@ class HolidayEditView(LoginRequiredMixin, View):
         })
 
     @method_decorator(parse_json_body)
+    @method_decorator(transaction.atomic)
     def patch(self, request, holiday_id):
         if request.user.is_employer:
             holiday = get_object_or_404(Holiday, id=holiday_id, company=request.user.company)
@@ -66,12 +55,8 @@ class HolidayEditView(LoginRequiredMixin, View):
         except ValueError as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
-        old_days = calculate_weekdays(holiday.start_date, holiday.end_date)
-        new_days = calculate_weekdays(start_date, end_date)
-        diff = new_days - old_days
-
+        new_days = holiday.working_calendar.count_holiday_days(data.get('type', holiday.type), start_date, end_date)
         is_paid = {"none": True, "on": False}.get(data.get("paid"), True)
-        old_paid = holiday.paid
 
         if holiday.type == 'bank_holiday':
             if not request.user.is_employer:
@@ -81,27 +66,31 @@ class HolidayEditView(LoginRequiredMixin, View):
             if new_type != 'bank_holiday':
                 return self._convert_bank_to_personal(request, holiday, data, start_date, end_date, new_type, is_paid)
 
-            return self._process_bank_holiday(request, holiday, data, start_date, end_date, old_days, new_days, diff, is_paid)
+            return self._process_bank_holiday(request, holiday, data, start_date, end_date, new_days, is_paid)
         else:
-            return self._process_normal_holiday(request, holiday, data, start_date, end_date, diff, is_paid, old_paid, old_days, new_days)
-
-    def _process_bank_holiday(self, request, holiday, data, start_date, end_date, old_days, new_days, diff, is_paid):
-        new_user_ids = data.get('employees', [])
-        new_users = set(User.objects.filter(id__in=new_user_ids, company=request.user.company))
-        old_users = set(holiday.users.all())
-        kept_users = new_users & old_users
-        added_users = new_users - old_users
+            return self._process_normal_holiday(request, holiday, data, start_date, end_date, new_days, is_paid)
 
-        insufficient_users = []
-
-        if diff > 0:
-            for user in kept_users:
-                if not user.has_enough_holidays(diff):
-                    insufficient_users.append(f"{user.get_full_name() or user.email} ({user.remaining_holidays} left)")
-
-        for user in added_users:
-            if not user.has_enough_holidays(new_days):
-                insufficient_users.append(f"{user.get_full_name() or user.email} ({user.remaining_holidays} left)")
+    def _process_bank_holiday(self, request, holiday, data, start_date, end_date, new_days, is_paid):
+        new_user_ids = set(
+            User.objects.filter(id__in=data.get('employees', []), company=request.user.company).values_list('id', flat=True)
+        )
+        old_user_ids = set(holiday.users.values_list('id', flat=True))
+
+        # Days each user was charged before the edit and will be charged after it.
+        old_charges = HolidayLedgerEntry.objects.charged_days(holiday, old_user_ids)
+        new_charge = new_days if is_paid else 0
+        deltas = {
+            user_id: (new_charge if user_id in new_user_ids else 0) - old_charges.get(user_id, 0)
+            for user_id in new_user_ids | old_user_ids
+        }
+
+        users = HolidayBalance.objects.lock(
+            User.objects.filter(id__in=deltas.keys()), [holiday.start_date.year, start_date.year]
+        )
+        insufficient_users = [
+            f"{user.get_full_name() or user.email} ({user.remaining_holidays} left)"
+            for user in users if deltas[user.id] > 0 and not user.has_enough_holidays(deltas[user.id])
+        ]
 
         if insufficient_users:
             return JsonResponse({
@@ -109,26 +98,12 @@ class HolidayEditView(LoginRequiredMixin, View):
                 'error': 'Not enough holidays for: ' + ', '.join(insufficient_users)
             }, status=400)
 
-        for user in old_users - new_users:
-            user.adjust_holidays(old_days)
-            user.save()
-
-        for user in kept_users:
-            user.adjust_holidays(-diff)
-            user.save()
-
-        for user in added_users:
-            user.adjust_holidays(-new_days)
-            user.save()
-
-        if holiday.paid != is_paid:
-            multiplier = 1 if is_paid else -1
-            for user in new_users:
-                user.adjust_holidays(multiplier * new_days)
-                user.save()
-
+        HolidayLedgerEntry.objects.record(
+            HolidayLedgerEntry.objects.refunds(holiday, old_user_ids)
+            + [HolidayLedgerEntry.for_holiday(holiday, user_id, new_charge, start_date) for user_id in new_user_ids]
+        )
 
-        holiday.users.set(new_users)
+        holiday.users.set(new_user_ids)
         holiday.start_date = start_date
         holiday.end_date = end_date
         holiday.reason = data.get('reason', '').strip()
@@ -140,27 +115,23 @@ class HolidayEditView(LoginRequiredMixin, View):
         return JsonResponse({'success': True, 'id': holiday.id})
 
     def _convert_bank_to_personal(self, request, holiday, data, start_date, end_date, new_type, is_paid):
-        new_days = calculate_weekdays(start_date, end_date)
+        # The bank holiday being converted must not reduce the day count of its replacements.
+        calendar = WorkingCalendar.for_company(holiday.company_id, exclude_ids=[holiday.id])
+        new_charge = calendar.count_holiday_days(new_type, start_date, end_date) if is_paid else 0
         reason = data.get('reason', '').strip()
-        users = holiday.users.all()
-
-        for user in users:
-            user.adjust_holidays(-calculate_weekdays(holiday.start_date, holiday.end_date))
-            user.save()
+        users = HolidayBalance.objects.lock(User.objects.filter(holidays=holiday), [holiday.start_date.year, start_date.year])
+        old_charges = HolidayLedgerEntry.objects.charged_days(holiday, [u.id for u in users])
 
         insufficient = [
-            f"{u.get_full_name() or u.email} ({u.remaining_holidays} left)"
-            for u in users if not u.has_enough_holidays(new_days)
+            f"{u.get_full_name() or u.email} ({u.remaining_holidays + old_charges.get(u.id, 0)} left)"
+            for u in users if not u.has_enough_holidays(new_charge - old_charges.get(u.id, 0))
         ]
         if insufficient:
-            for user in users:
-                user.adjust_holidays(calculate_weekdays(holiday.start_date, holiday.end_date))
-                user.save()
             return JsonResponse({'success': False, 'error': 'Not enough holidays for: ' + ', '.join(insufficient)}, status=400)
 
-        for user in users:
-            new_holiday = Holiday.objects.create(
-                company=holiday.company,
+        new_holidays = Holiday.objects.bulk_create([
+            Holiday(
+                company_id=holiday.company_id,
                 start_date=start_date,
                 end_date=end_date,
                 reason=reason,
@@ -168,33 +139,43 @@ class HolidayEditView(LoginRequiredMixin, View):
                 status='approved',
                 paid=is_paid,
             )
-            new_holiday.users.add(user)
-            user.adjust_holidays(new_days)
-            user.save()
+            for _ in users
+        ])
+
+        HolidayUser = Holiday.users.through
+        HolidayUser.objects.bulk_create([
+            HolidayUser(holiday_id=new_holiday.id, customuser_id=user.id)
+            for new_holiday, user in zip(new_holidays, users)
+        ])
+
+        HolidayLedgerEntry.objects.record(
+            HolidayLedgerEntry.objects.refunds(holiday, [user.id for user in users])
+            + [
+                HolidayLedgerEntry.for_holiday(new_holiday, user.id, new_charge)
+                for new_holiday, user in zip(new_holidays, users)
+            ]
+        )
 
         holiday.delete()
 
         return JsonResponse({'success': True})
 
-    def _process_normal_holiday(self, request, holiday, data, start_date, end_date, diff, is_paid, old_paid, old_days, new_days):
-        user = holiday.users.first()
+    def _process_normal_holiday(self, request, holiday, data, start_date, end_date, new_days, is_paid):
+        user, = HolidayBalance.objects.lock(User.objects.filter(holidays=holiday)[:1], [holiday.start_date.year, start_date.year])
+        new_charge = new_days if is_paid else 0
+        diff = new_charge - HolidayLedgerEntry.objects.charged_days(holiday, [user.id]).get(user.id, 0)
 
-        if diff > 0 and (old_paid or is_paid):
-            if not user.has_enough_holidays(diff):
-                return JsonResponse({
-                    'success': False,
-                    'error': f'Not enough remaining holidays. You need {diff} more days.'
-                }, status=400)
+        if diff > 0 and not user.has_enough_holidays(diff):
+            return JsonResponse({
+                'success': False,
+                'error': f'Not enough remaining holidays. You need {diff} more days.'
+            }, status=400)
 
         if request.user.is_employer:
-            if old_paid and is_paid:
-                user.adjust_holidays(diff)
-            elif old_paid and not is_paid:
-                user.adjust_holidays(-old_days)
-            elif not old_paid and is_paid:
-                user.adjust_holidays(new_days)
-
-            user.save()
+            HolidayLedgerEntry.objects.record(
+                HolidayLedgerEntry.objects.refunds(holiday, [user.id])
+                + [HolidayLedgerEntry.for_holiday(holiday, user.id, new_charge, start_date)]
+            )
 
             holiday.start_date = start_date
             holiday.end_date = end_date
@@ -223,6 +204,7 @@ class HolidayDeleteView(LoginRequiredMixin, View):
         self._delete_holiday_and_restore_days(holiday)
         return JsonResponse({'success': True, 'id': holiday_id}, status=200)
 
+    @method_decorator(transaction.atomic)
     def patch(self, request, holiday_id):
         if request.user.is_employer:
             holiday = get_object_or_404(Holiday, id=holiday_id, company=request.user.company)
@@ -238,12 +220,9 @@ class HolidayDeleteView(LoginRequiredMixin, View):
             return JsonResponse({'success': True, 'id': holiday.id}, status=200)
 
     def _delete_holiday_and_restore_days(self, holiday):
-        users = list(holiday.users.all())
-        if holiday.paid:
-            days_to_return = holiday.number_of_days
-            for user in users:
-                user.adjust_holidays(-days_to_return)
-            User.objects.bulk_update(users, ['used_holidays'])
+        HolidayLedgerEntry.objects.record(
+            HolidayLedgerEntry.objects.refunds(holiday, holiday.users.values_list('id', flat=True))
+        )
         holiday.delete()
 
 
@@ -251,18 +230,23 @@ class HolidayDeleteView(LoginRequiredMixin, View):
 @login_required
 @parse_json_body
 @employer_required
+@transaction.atomic
 def process_holiday_request(request, holiday_id):
     data = request.json_data
     action = data.get("action")
 
     holiday = get_object_or_404(Holiday, id=holiday_id, company=request.user.company)
-    user = holiday.users.first()
+    leave_years = [holiday.start_date.year] + ([holiday.pending_start_date.year] if holiday.pending_start_date else [])
+    users = HolidayBalance.objects.lock(holiday.users.all()[:1], leave_years)
+    user = users[0] if users else None
 
     if action == "accept_edit":
-        diff = holiday.number_of_pending_days - holiday.number_of_days
-        if holiday.paid:
-            user.adjust_holidays(diff)
-            user.save()
+        HolidayLedgerEntry.objects.record(
+            HolidayLedgerEntry.objects.refunds(holiday, [user.id])
+            + [HolidayLedgerEntry.for_holiday(
+                holiday, user.id, holiday.number_of_pending_days if holiday.pending_paid else 0, holiday.pending_start_date
+            )]
+        )
 
         holiday.apply_pending()
         holiday.status = "approved"
@@ -274,9 +258,7 @@ def process_holiday_request(request, holiday_id):
         holiday.save()
 
     elif action == "accept_delete":
-        if holiday.paid:
-            user.adjust_holidays(-holiday.number_of_days)
-            user.save()
+        HolidayLedgerEntry.objects.record(HolidayLedgerEntry.objects.refunds(holiday, [user.id for user in users]))
         holiday.delete()
         return JsonResponse({'success': True})
 
@@ -289,9 +271,7 @@ def process_holiday_request(request, holiday_id):
         holiday.save()
 
     elif action == "decline":
-        if holiday.paid:
-            user.adjust_holidays(-holiday.number_of_days)
-            user.save()
+        HolidayLedgerEntry.objects.record(HolidayLedgerEntry.objects.refunds(holiday, [user.id for user in users]))
         holiday.delete()
         return JsonResponse({'success': True})
 
@@ -303,6 +283,7 @@ def process_holiday_request(request, holiday_id):
 @require_http_methods(["POST"])
 @login_required
 @parse_json_body
+@transaction.atomic
 def create_holiday(request):
     data = request.json_data
 
@@ -311,8 +292,8 @@ def create_holiday(request):
     except ValueError as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
-    days_requested = calculate_weekdays(start_date, end_date)
     holiday_type = data.get('type', 'other')
+    days_requested = WorkingCalendar.for_company(request.user.company_id).count_holiday_days(holiday_type, start_date, end_date)
     reason = data.get('reason', '').strip()
     
     is_paid = {"none": True, "on": False}.get(data.get("paid"), True)
@@ -321,7 +302,9 @@ def create_holiday(request):
         if not request.user.is_employer:
             return JsonResponse({'success': False, 'error': 'Unauthorized to create bank holidays.'}, status=403)
 
-        users = list(User.objects.filter(id__in=data.get('employees', []), company=request.user.company))
+        users = HolidayBalance.objects.lock(
+            User.objects.filter(id__in=data.get('employees', []), company=request.user.company), [start_date.year]
+        )
 
         if is_paid:
             insufficient_users = [
@@ -346,17 +329,18 @@ def create_holiday(request):
         holiday.users.set(users)
 
         if is_paid:
-            for user in users:
-                user.adjust_holidays(days_requested)
-            User.objects.bulk_update(users, ['used_holidays'])
+            HolidayLedgerEntry.objects.record([
+                HolidayLedgerEntry.for_holiday(holiday, user.id, days_requested) for user in users
+            ])
 
         return JsonResponse({'success': True, 'id': holiday.id}, status=201)
 
     else:
         if len(data.get('employees', [])) > 0:
-            users = list(User.objects.filter(id__in=data.get('employees', []), company=request.user.company))
+            users = User.objects.filter(id__in=data.get('employees', []), company=request.user.company)
         else:
-            users = [request.user]
+            users = User.objects.filter(id=request.user.id)
+        users = HolidayBalance.objects.lock(users, [start_date.year])
 
         if is_paid:
             insufficient_users = [
@@ -381,14 +365,13 @@ def create_holiday(request):
                 paid=is_paid
             )
             holiday.users.add(user)
-
-            if is_paid:
-                user.adjust_holidays(days_requested)
-
             holidays.append(holiday)
 
         if is_paid:
-            User.objects.bulk_update(users, ['used_holidays'])
+            HolidayLedgerEntry.objects.record([
+                HolidayLedgerEntry.for_holiday(holiday, user.id, days_requested)
+                for holiday, user in zip(holidays, users)
+            ])
 
         return JsonResponse({'success': True, 'ids': [h.id for h in holidays]}, status=201)
 
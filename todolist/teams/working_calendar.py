@@ -0,0 +1,71 @@
+# Standard libs
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+
+def count_weekdays(start_date, end_date):
+    """Number of Monday-Friday days in the inclusive range, without walking it."""
+    if not start_date or not end_date or end_date < start_date:
+        return 0
+
+    full_weeks, remainder = divmod((end_date - start_date).days + 1, 7)
+    start_weekday = start_date.weekday()
+    extra_days = sum(1 for offset in range(remainder) if (start_weekday + offset) % 7 < 5)
+    return full_weeks * 5 + extra_days
+
+
+class WorkingCalendar:
+    """
+    Working days of a company: weekdays that are not company bank holidays.
+
+    Bank holiday weekdays are kept in a sorted list, so counting them within a range is two bisects.
+    """
+
+    def __init__(self, bank_holiday_ranges=()):
+        dates = set()
+        for start_date, end_date in bank_holiday_ranges:
+            current = start_date
+            while current <= end_date:
+                if current.weekday() < 5:
+                    dates.add(current)
+                current += timedelta(days=1)
+        self.bank_holidays = sorted(dates)
+
+    @classmethod
+    def for_company(cls, company_id, exclude_ids=()):
+        """Calendar of the company's bank holidays, optionally ignoring some (e.g. one being converted)."""
+        from teams.models import Holiday
+
+        ranges = (
+            Holiday.objects
+            .filter(company_id=company_id, type='bank_holiday')
+            .exclude(id__in=exclude_ids)
+            .values_list('start_date', 'end_date')
+            .order_by()
+        )
+        return cls(ranges)
+
+    def count_bank_holidays(self, start_date, end_date):
+        if not start_date or not end_date or end_date < start_date:
+            return 0
+        return bisect_right(self.bank_holidays, end_date) - bisect_left(self.bank_holidays, start_date)
+
+    def count_working_days(self, start_date, end_date):
+        return count_weekdays(start_date, end_date) - self.count_bank_holidays(start_date, end_date)
+
+    def count_holiday_days(self, holiday_type, start_date, end_date):
+        """
+        Allowance days a holiday of the given type uses.
+
+        Bank holidays use every weekday they cover; other holidays skip days that are already bank holidays.
+        """
+        if holiday_type == 'bank_holiday':
+            return count_weekdays(start_date, end_date)
+        return self.count_working_days(start_date, end_date)
+
+    def count_many(self, holidays):
+        """Map holiday id to its day count."""
+        return {
+            holiday.id: self.count_holiday_days(holiday.type, holiday.start_date, holiday.end_date)
+            for holiday in holidays
+        }
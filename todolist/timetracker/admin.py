@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import TimeEntry
+from .models import DailyProjectTime, TimeEntry
 
 
-admin.site.register(TimeEntry)
\ No newline at end of file
+admin.site.register(TimeEntry)
+admin.site.register(DailyProjectTime)
@@ -0,0 +1,46 @@
+# Standard libs
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+import zoneinfo
+
+# Django
+from django.db.models import DateTimeField, DurationField, ExpressionWrapper, F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def local_day_bounds(start_date, end_date, tzinfo=None):
+    """Return aware datetimes covering start_date 00:00 up to (excluding) the day after end_date."""
+    tzinfo = tzinfo or timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(start_date, time.min), tzinfo)
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tzinfo)
+    return start, end
+
+def split_by_local_day(start_time, end_time, tzinfo):
+    """Split the interval into whole seconds per local date, cutting at each local midnight."""
+    if isinstance(tzinfo, str):
+        tzinfo = zoneinfo.ZoneInfo(tzinfo)
+
+    seconds_by_date = {}
+    current = timezone.localtime(start_time, tzinfo)
+    end = timezone.localtime(end_time, tzinfo)
+
+    while current < end:
+        next_midnight = timezone.make_aware(datetime.combine(current.date() + timedelta(days=1), time.min), tzinfo)
+        boundary = min(next_midnight, end)
+        # Subtracting in UTC: aware datetimes in the same zone subtract as wall-clock times, which is off across DST changes.
+        seconds_by_date[current.date()] = int((boundary.astimezone(dt_timezone.utc) - current.astimezone(dt_timezone.utc)).total_seconds())
+        current = timezone.localtime(boundary, tzinfo)
+
+    return seconds_by_date
+
+def tracked_duration(now=None, prefix=''):
+    """
+    Duration of a time entry as a database expression, clipping running entries to now.
+
+    prefix reaches the entry through a relation, e.g. 'time_entries__' from a project.
+    """
+    now = now or timezone.now()
+    return ExpressionWrapper(
+        Coalesce(f'{prefix}end_time', Value(now, output_field=DateTimeField())) - F(f'{prefix}start_time'),
+        output_field=DurationField()
+    )
@@ -0,0 +1,177 @@
+# Standard libs
+from datetime import timedelta
+import random
+import statistics
+import time
+import uuid
+
+# Django
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import UniqueConstraint
+from django.utils import timezone
+
+# Local apps
+from main.models import Project, Task
+from teams.models import Company, Holiday
+from .models import TimeEntry
+
+
+User = get_user_model()
+
+# Models whose Meta.indexes (and partial unique constraints) the benchmark compares against an unindexed schema.
+INDEXED_MODELS = ('timetracker.TimeEntry', 'main.Task', 'teams.Holiday')
+
+def seed_benchmark_data(companies=1, users_per_company=50, projects_per_company=10, entries_per_user=500,
+                        tasks_per_user=200, holidays_per_user=5, running_ratio=0.1, days=365, password=None,
+                        seed=0, batch_size=1000):
+    """
+    Bulk insert a realistic data set and return the created companies.
+
+    Time entries go back up to days days; the first user of each company is its employer and
+    every user gets password (unusable if None).
+
+    Everything is written with bulk_create(), so signals do not run: rebuild the DailyProjectTime
+    rollup and reconcile the pending holiday counters afterwards if the data is kept.
+    """
+    rng = random.Random(seed)
+    token = uuid.uuid4().hex[:8]
+    now = timezone.now()
+    today = timezone.localdate()
+    password = make_password(password)
+
+    created = Company.objects.bulk_create([
+        Company(name=f"Benchmark {token} {i}", slug=f"benchmark-{token}-{i}") for i in range(companies)
+    ])
+
+    users = User.objects.bulk_create([
+        User(
+            email=f"bench-{token}-{company.id}-{i}@example.com",
+            first_name=f"User{i}",
+            password=password,
+            company=company,
+            role='employer' if i == 0 else 'employee',
+        )
+        for company in created
+        for i in range(users_per_company)
+    ], batch_size=batch_size)
+
+    projects = Project.objects.bulk_create([
+        Project(title=f"Project {i}", company=company, color=f"#{rng.randrange(0x1000000):06x}")
+        for company in created
+        for i in range(projects_per_company)
+    ], batch_size=batch_size)
+
+    projects_by_company = {}
+    for project in projects:
+        projects_by_company.setdefault(project.company_id, []).append(project)
+
+    entries = []
+    tasks = []
+    for user in users:
+        company_projects = projects_by_company[user.company_id]
+        for _ in range(entries_per_user):
+            start = now - timedelta(days=rng.uniform(0, days), hours=rng.uniform(0, 12))
+            entries.append(TimeEntry(
+                user=user,
+                name="Benchmark entry",
+                project=rng.choice(company_projects),
+                start_time=start,
+                end_time=start + timedelta(minutes=rng.randint(15, 240)),
+                timezone=user.timezone,
+            ))
+        if rng.random() < running_ratio:
+            entries.append(TimeEntry(
+                user=user,
+                name="Running",
+                project=rng.choice(company_projects),
+                start_time=now - timedelta(minutes=rng.randint(1, 300)),
+                timezone=user.timezone,
+            ))
+
+        for i in range(tasks_per_user):
+            due_date = today + timedelta(days=rng.randint(-180, 60))
+            is_completed = due_date < today and rng.random() < 0.8
+            tasks.append(Task(
+                user=user,
+                project=rng.choice(company_projects),
+                title=f"Task {i}",
+                due_date=due_date,
+                is_completed=is_completed,
+                completed_at=due_date if is_completed else None,
+            ))
+
+    TimeEntry.objects.bulk_create(entries, batch_size=batch_size)
+    Task.objects.bulk_create(tasks, batch_size=batch_size)
+
+    holidays = []
+    holiday_users = []
+    statuses = [status for status, _ in Holiday.STATUS_CHOICES]
+    for user in users:
+        for _ in range(holidays_per_user):
+            start_date = today + timedelta(days=rng.randint(-300, 120))
+            holidays.append(Holiday(
+                company_id=user.company_id,
+                start_date=start_date,
+                end_date=start_date + timedelta(days=rng.randint(0, 4)),
+                reason="Benchmark",
+                type='holiday',
+                status=rng.choice(statuses),
+            ))
+            holiday_users.append(user)
+    holidays = Holiday.objects.bulk_create(holidays, batch_size=batch_size)
+
+    HolidayUser = Holiday.users.through
+    HolidayUser.objects.bulk_create([
+        HolidayUser(holiday_id=holiday.id, customuser_id=user.id) for holiday, user in zip(holidays, holiday_users)
+    ], batch_size=batch_size)
+
+    # Fresh planner statistics, so the plans reflect the seeded volume.
+    if connection.vendor in ('postgresql', 'sqlite'):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    return created
+
+def benchmark_queries(user, company):
+    """The hot lookups the indexes are meant for, as (label, queryset) pairs."""
+    today = timezone.localdate()
+    week_start = timezone.now() - timedelta(days=7)
+    project = Project.objects.filter(company=company).first()
+
+    return [
+        ("Running timer for a user", TimeEntry.objects.filter(user=user, end_time__isnull=True)),
+        ("User's entries this week", TimeEntry.objects.filter(user=user, start_time__gte=week_start)),
+        ("Project's entries this week", TimeEntry.objects.filter(project=project, start_time__gte=week_start)),
+        ("User's task list (todolist order)", Task.objects.filter(user=user).order_by('is_completed', 'due_date')),
+        ("User's overdue open tasks", Task.objects.filter(user=user, is_completed=False, due_date__lt=today)),
+        ("User's tasks completed this month", Task.objects.filter(user=user, completed_at__gte=today.replace(day=1))),
+        ("Company's pending holidays", Holiday.objects.filter(company=company, status='pending')),
+    ]
+
+def time_queryset(queryset, repeat):
+    """Median milliseconds to fetch the queryset, over repeat runs."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def drop_indexes():
+    """
+    Drop the Meta.indexes of INDEXED_MODELS, and the conditional unique constraints that serve as partial
+    indexes (e.g. the running timer one); run inside a transaction that is rolled back afterwards.
+    """
+    with connection.cursor() as cursor:
+        for label in INDEXED_MODELS:
+            meta = apps.get_model(label)._meta
+            partial_uniques = [
+                constraint for constraint in meta.constraints
+                if isinstance(constraint, UniqueConstraint) and constraint.condition is not None
+            ]
+            # Both are created as plain (partial) indexes on SQLite and PostgreSQL.
+            for index in [*meta.indexes, *partial_uniques]:
+                cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
@@ -0,0 +1,63 @@
+# Django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+# Local apps
+from teams.models import Company
+from timetracker.benchmark import benchmark_queries, drop_indexes, seed_benchmark_data, time_queryset
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds benchmark data and prints the query plan and timing of the hot TimeEntry, Task and Holiday "
+        "lookups with and without their indexes. Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=1)
+        parser.add_argument('--users', type=int, default=50, help="Users per company.")
+        parser.add_argument('--entries-per-user', type=int, default=500)
+        parser.add_argument('--tasks-per-user', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per query; the median is reported.")
+        parser.add_argument('--no-seed', action='store_true', help="Benchmark the existing data instead of seeding.")
+
+    def handle(self, *args, **options):
+        if not connection.features.can_rollback_ddl:
+            raise CommandError("Dropping indexes temporarily needs a database with transactional DDL (PostgreSQL or SQLite).")
+
+        with transaction.atomic():
+            if options['no_seed']:
+                company = Company.objects.filter(employees__isnull=False).first()
+                if company is None:
+                    raise CommandError("No company with employees to benchmark; run without --no-seed.")
+            else:
+                self.stdout.write("Seeding benchmark data...")
+                company = seed_benchmark_data(
+                    companies=options['companies'],
+                    users_per_company=options['users'],
+                    entries_per_user=options['entries_per_user'],
+                    tasks_per_user=options['tasks_per_user'],
+                )[0]
+            user = company.employees.first()
+
+            with transaction.atomic():
+                drop_indexes()
+                before = self.measure(user, company, options['repeat'])
+                transaction.set_rollback(True)
+
+            after = self.measure(user, company, options['repeat'])
+            transaction.set_rollback(True)
+
+        for label, (before_ms, before_plan) in before.items():
+            after_ms, after_plan = after[label]
+            speedup = before_ms / after_ms if after_ms else 0
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(f"  without indexes: {before_ms:.3f} ms\n    " + before_plan.replace('\n', '\n    '))
+            self.stdout.write(f"  with indexes:    {after_ms:.3f} ms\n    " + after_plan.replace('\n', '\n    '))
+            self.stdout.write(f"  speedup: {speedup:.1f}x")
+
+    def measure(self, user, company, repeat):
+        return {
+            label: (time_queryset(queryset, repeat), queryset.explain())
+            for label, queryset in benchmark_queries(user, company)
+        }
@@ -1,61 +1,109 @@
 # Standard libs
 from datetime import timedelta
+import time
 
 # Django
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
 from django.urls import reverse
 
 # Local apps
+from teams.mail import enqueue_emails
 from timetracker.models import TimeEntry
+from timetracker.timers import apply_stopped_entries
 
 
 domain = getattr(settings, 'SITE_DOMAIN', '127.0.0.1')
 path = reverse('timetracker:timetracker')
 tracker_url = f"https://{domain}{path}"
 
+WARNING_AFTER = timedelta(hours=10)
+STOP_AFTER = timedelta(hours=23, minutes=59)
+FROM_EMAIL = "no-reply@yourdomain.com"
+
+def stopped_message(entry):
+    return (
+        "Time Entry Automatically Stopped",
+        (
+            f"Hi {entry.user.get_full_name()},\n\n"
+            f"Your time entry \"{entry.name}\" has automatically been stopped after reaching 24 hours.\n\n"
+            f"You can review it if needed here: {tracker_url}\n\n"
+        ),
+        FROM_EMAIL,
+        [entry.user.email],
+    )
+
+def warning_message(entry):
+    return (
+        "Time Entry Running for Over 10 Hours",
+        (
+            f"Hi {entry.user.get_full_name()},\n\n"
+            f"Your time entry \"{entry.name}\" has been running for over 10 hours.\n"
+            "It will automatically be stopped if it exceeds 24 hours.\n\n"
+            "Please stop it manually if you're done.\n"
+            f"You can review it if needed here: {tracker_url}"
+        ),
+        FROM_EMAIL,
+        [entry.user.email],
+    )
+
 class Command(BaseCommand):
     help = "Handles time entries running too long: sends warnings and stops if needed."
 
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would happen without stopping entries or sending mail.")
+
     def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        started = time.monotonic()
         now = timezone.now()
-        entries = TimeEntry.objects.filter(end_time__isnull=True)
+
+        with transaction.atomic():
+            entries = list(
+                TimeEntry.objects
+                .select_for_update(of=('self',))
+                .filter(end_time__isnull=True, start_time__lt=now - WARNING_AFTER)
+                .select_related('user', 'project')
+                .order_by('start_time')
+            )
+            to_stop = [entry for entry in entries if now - entry.start_time > STOP_AFTER]
+            to_warn = [entry for entry in entries if now - entry.start_time <= STOP_AFTER]
+            selected = time.monotonic()
+
+            if to_stop and not dry_run:
+                self.stop_entries(to_stop, now)
+        stopped = time.monotonic()
+
+        for entry in to_stop:
+            self.stdout.write(f"[AUTO-STOPPED] Entry: \"{entry.name}\" | User: {entry.user.get_full_name()} | ID: {entry.id}")
+        for entry in to_warn:
+            self.stdout.write(f"[WARNING] 10h+ Entry: \"{entry.name}\" | User: {entry.user.get_full_name()} | ID: {entry.id}")
+
+        messages = [stopped_message(entry) for entry in to_stop] + [warning_message(entry) for entry in to_warn]
+        queued = 0
+        if messages and not dry_run:
+            # Delivery is left to the send_queued_emails worker.
+            queued = len(enqueue_emails(messages))
+        finished = time.monotonic()
+
+        prefix = "[DRY RUN] Would stop" if dry_run else "Stopped"
+        self.stdout.write(
+            f"{prefix} {len(to_stop)} entr(ies), warned about {len(to_warn)}, queued {queued}/{len(messages)} email(s) "
+            f"in {finished - started:.2f}s (select {selected - started:.2f}s, stop {stopped - selected:.2f}s, "
+            f"mail {finished - stopped:.2f}s)."
+        )
+
+    def stop_entries(self, entries, now):
+        """Stop entries with one UPDATE; apply_stopped_entries() stands in for the save() signals."""
+        TimeEntry.objects.filter(id__in=[entry.id for entry in entries]).update(
+            end_time=F('start_time') + STOP_AFTER,
+            updated_at=now
+        )
 
         for entry in entries:
-            duration = now - entry.start_time
-            user = entry.user
-
-            if duration > timedelta(hours=23, minutes=59):
-                entry.end_time = entry.start_time + timedelta(hours=23, minutes=59)
-                entry.save()
-
-                send_mail(
-                    subject="Time Entry Automatically Stopped",
-                    message=(
-                        f"Hi {user.get_full_name()},\n\n"
-                        f"Your time entry \"{entry.name}\" has automatically been stopped after reaching 24 hours.\n\n"
-                        f"You can review it if needed here: {tracker_url}\n\n"
-                    ),
-                    from_email="no-reply@yourdomain.com",
-                    recipient_list=[user.email],
-                    fail_silently=True,
-                )
-                self.stdout.write(f"[AUTO-STOPPED] Entry: \"{entry.name}\" | User: {user.get_full_name()} | ID: {entry.id}")
-
-            elif duration > timedelta(hours=10):
-                send_mail(
-                    subject="Time Entry Running for Over 10 Hours",
-                    message=(
-                        f"Hi {user.get_full_name()},\n\n"
-                        f"Your time entry \"{entry.name}\" has been running for over 10 hours.\n"
-                        "It will automatically be stopped if it exceeds 24 hours.\n\n"
-                        "Please stop it manually if you're done.\n"
-                        f"You can review it if needed here: {tracker_url}"
-                    ),
-                    from_email="no-reply@yourdomain.com",
-                    recipient_list=[user.email],
-                    fail_silently=True,
-                )
-                self.stdout.write(f"[WARNING] 10h+ Entry: \"{entry.name}\" | User: {user.get_full_name()} | ID: {entry.id}")
+            entry.end_time = entry.start_time + STOP_AFTER
+            entry.updated_at = now
+        apply_stopped_entries(entries)
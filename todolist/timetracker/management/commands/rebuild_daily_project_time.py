@@ -0,0 +1,63 @@
+# Standard libs
+from collections import defaultdict
+
+# Django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+# Local apps
+from timetracker.aggregates import split_by_local_day
+from timetracker.models import DailyProjectTime, TimeEntry
+
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = "Rebuilds the DailyProjectTime rollup from all stopped time entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk insert.")
+
+    def handle(self, *args, **options):
+        # Entries from before the timezone was stored on them are rolled up in their user's current one.
+        backfilled = TimeEntry.objects.filter(timezone='').update(
+            timezone=Subquery(User.objects.filter(id=OuterRef('user_id')).values('timezone')[:1])
+        )
+
+        totals = defaultdict(int)
+        entry_count = 0
+
+        with transaction.atomic():
+            # Reading the entries under lock makes a timer stopped (or entry edited) meanwhile wait and
+            # apply its rollup change after the rebuild, instead of having it wiped by the delete below.
+            entries = (
+                TimeEntry.objects
+                .select_for_update()
+                .filter(project__isnull=False)
+                .values_list('user_id', 'project_id', 'start_time', 'end_time', 'timezone')
+                .order_by()
+            )
+
+            for user_id, project_id, start_time, end_time, entry_timezone in entries.iterator(chunk_size=options['batch_size']):
+                # Running entries are only locked; their time is added on read until they stop.
+                if end_time is None:
+                    continue
+                for date, seconds in split_by_local_day(start_time, end_time, entry_timezone).items():
+                    totals[(user_id, project_id, date)] += seconds
+                entry_count += 1
+
+            rows = [
+                DailyProjectTime(user_id=user_id, project_id=project_id, date=date, seconds=seconds)
+                for (user_id, project_id, date), seconds in totals.items()
+                if seconds > 0
+            ]
+
+            DailyProjectTime.objects.all().delete()
+            DailyProjectTime.objects.bulk_create(rows, batch_size=options['batch_size'])
+
+        self.stdout.write(
+            f"Rebuilt {len(rows)} rollup row(s) from {entry_count} time entr(ies); "
+            f"stored the timezone of {backfilled} older entr(ies)."
+        )
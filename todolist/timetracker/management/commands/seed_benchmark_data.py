@@ -0,0 +1,64 @@
+# Standard libs
+from io import StringIO
+import time
+
+# Django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+# Local apps
+from timetracker.benchmark import seed_benchmark_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds companies with employees, projects, months of time entries, tasks and holidays for load testing, "
+        "then rebuilds the DailyProjectTime rollup and the pending holiday counters."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=1)
+        parser.add_argument('--users', type=int, default=50, help="Users per company; the first one is the employer.")
+        parser.add_argument('--projects', type=int, default=10, help="Projects per company.")
+        parser.add_argument('--months', type=int, default=12, help="How far back the time entries go.")
+        parser.add_argument('--entries-per-user', type=int, default=500)
+        parser.add_argument('--tasks-per-user', type=int, default=200)
+        parser.add_argument('--holidays-per-user', type=int, default=5)
+        parser.add_argument('--running-ratio', type=float, default=0.1, help="Share of users with a running timer.")
+        parser.add_argument('--password', help="Password for every seeded user; without it they cannot log in.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible data sets.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk insert.")
+
+    def handle(self, *args, **options):
+        if options['companies'] < 1 or options['users'] < 1 or options['projects'] < 1 or options['months'] < 1:
+            raise CommandError("--companies, --users, --projects and --months must be at least 1.")
+
+        started = time.monotonic()
+        with transaction.atomic():
+            companies = seed_benchmark_data(
+                companies=options['companies'],
+                users_per_company=options['users'],
+                projects_per_company=options['projects'],
+                entries_per_user=options['entries_per_user'],
+                tasks_per_user=options['tasks_per_user'],
+                holidays_per_user=options['holidays_per_user'],
+                running_ratio=options['running_ratio'],
+                days=options['months'] * 30,
+                password=options['password'],
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+            )
+        seeded = time.monotonic() - started
+
+        # bulk_create() skips the signals that keep these in sync; the drift they report is expected.
+        call_command('rebuild_daily_project_time', batch_size=options['batch_size'], stdout=StringIO())
+        call_command('reconcile_pending_holidays', stdout=StringIO())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(companies)} compan(ies) in {seeded:.1f}s "
+            f"({time.monotonic() - started:.1f}s with the rebuilds)."
+        ))
+        for company in companies:
+            employer = company.employees.filter(role='employer').first()
+            self.stdout.write(f"  {company.name}: employer {employer.email}")
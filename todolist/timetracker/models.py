@@ -1,8 +1,25 @@
+from collections import defaultdict
+from datetime import timedelta
+
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
+from .aggregates import split_by_local_day
+
+
+class TimeEntryQuerySet(models.QuerySet):
+    def running(self):
+        """Entries without an end time; unordered, as there is at most one per user."""
+        return self.filter(end_time__isnull=True).order_by()
+
+    def running_for(self, user):
+        """The user's running entry or None, read from the unique partial index without a sort."""
+        return next(iter(self.running().filter(user=user)[:1]), None)
+
 
 class TimeEntry(models.Model):
     user = models.ForeignKey("users.CustomUser", on_delete=models.CASCADE, related_name='time_entries')
@@ -10,11 +27,25 @@ class TimeEntry(models.Model):
     project = models.ForeignKey("main.Project", on_delete=models.SET_NULL, blank=True, null=True, related_name='time_entries')
     start_time = models.DateTimeField(default=timezone.now)
     end_time = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # The user's timezone when the entry was created. The DailyProjectTime rollup splits the entry into
+    # local days by it for the entry's whole life, so a later timezone change cannot move its days.
+    timezone = models.CharField(max_length=32, blank=True)
+
+    objects = TimeEntryQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Time Entry'
         verbose_name_plural = 'Time Entries'
         ordering = ['-start_time']
+        indexes = [
+            models.Index(fields=['user', 'start_time'], name='timeentry_user_start_idx'),
+            models.Index(fields=['project', 'start_time'], name='timeentry_project_start_idx'),
+        ]
+        constraints = [
+            # Also the index behind running_for(): it only holds running timers.
+            models.UniqueConstraint(fields=['user'], condition=Q(end_time__isnull=True), name='timeentry_one_running_per_user'),
+        ]
 
     def __str__(self):
         return f"Time Entry for {self.name} ({self.start_time} - {self.end_time or 'ongoing'})"
@@ -75,3 +106,122 @@ class TimeEntry(models.Model):
         
         self.end_time = new_end_time
         self.save()
+
+
+class DailyProjectTimeManager(models.Manager):
+    def add_seconds(self, user_id, project_id, date, seconds):
+        """Add (or, with a negative value, remove) tracked seconds for one user, project and local date."""
+        rows = self.filter(user_id=user_id, project_id=project_id, date=date)
+
+        if seconds < 0:
+            rows.update(seconds=Greatest(F('seconds') + seconds, 0))
+            rows.filter(seconds=0).delete()
+        elif seconds > 0:
+            row, created = self.get_or_create(user_id=user_id, project_id=project_id, date=date, defaults={'seconds': seconds})
+            if not created:
+                rows.update(seconds=F('seconds') + seconds)
+
+    def daily_totals(self, start_date, end_date, *fields, **filters):
+        """
+        Tracked time per local date in the range, read from the rollup, as rows of 'day', 'total'
+        (a timedelta) and the grouping fields, ordered by day and fields.
+
+        fields and filters must mean the same on DailyProjectTime and TimeEntry (e.g. 'user_id',
+        'project__title', project__company=...): running entries are not in the rollup, so they
+        are added here, clipped to now, from a query on TimeEntry with the same filters.
+        """
+        return self.with_running(
+            self.stopped_totals(start_date, end_date, *fields, **filters),
+            self.running_entries(*fields, **filters),
+            start_date,
+            end_date,
+            fields
+        )
+
+    def stopped_totals(self, start_date, end_date, *fields, **filters):
+        """The rollup part of daily_totals(), in the same row format."""
+        rows = (
+            self.filter(date__gte=start_date, date__lte=end_date, **filters)
+            .values('date', *fields)
+            .annotate(total=Sum('seconds'))
+            .order_by()
+        )
+        return [
+            {'day': row['date'], **{field: row[field] for field in fields}, 'total': timedelta(seconds=row['total'])}
+            for row in rows
+        ]
+
+    def running_entries(self, *fields, **filters):
+        """
+        The running entries daily_totals() adds, as rows of start_time, timezone and the fields.
+
+        Unlike their tracked time they only change when an entry is saved, so they can be cached
+        with the stopped totals and passed to with_running() on every read.
+        """
+        return list(
+            TimeEntry.objects.running()
+            .filter(project__isnull=False, **filters)
+            .values('start_time', 'timezone', 'user__timezone', *fields)
+        )
+
+    def with_running(self, rows, running, start_date, end_date, fields):
+        """rows plus the time of the running entries up to now, merged by day and fields and sorted."""
+        totals = defaultdict(int)
+        for row in rows:
+            totals[(row['day'], tuple(row[field] for field in fields))] += row['total'].total_seconds()
+
+        now = timezone.now()
+        for row in running:
+            key = tuple(row[field] for field in fields)
+            for date, seconds in split_by_local_day(row['start_time'], now, row['timezone'] or row['user__timezone']).items():
+                if start_date <= date <= end_date:
+                    totals[(date, key)] += seconds
+
+        return [
+            {'day': date, **dict(zip(fields, key)), 'total': timedelta(seconds=seconds)}
+            for (date, key), seconds in sorted(totals.items(), key=lambda item: (item[0][0], [(value is None, value) for value in item[0][1]]))
+        ]
+
+    def apply_entry_change(self, previous, current):
+        """
+        Move an entry's contribution from its previous state to its current state.
+
+        Both states are dicts with user_id, project_id, start_time, end_time and timezone
+        (or None when the entry did not exist / no longer exists).
+        """
+        self.apply_entry_changes([(previous, current)])
+
+    def apply_entry_changes(self, changes):
+        """Apply many (previous, current) changes, touching each user, project and date once."""
+        deltas = defaultdict(int)
+
+        for previous, current in changes:
+            for state, sign in ((previous, -1), (current, 1)):
+                if not state or not state['project_id'] or not state['end_time']:
+                    continue
+                for date, seconds in split_by_local_day(state['start_time'], state['end_time'], state['timezone']).items():
+                    deltas[(state['user_id'], state['project_id'], date)] += sign * seconds
+
+        with transaction.atomic():
+            for (user_id, project_id, date), seconds in deltas.items():
+                self.add_seconds(user_id, project_id, date, seconds)
+
+
+class DailyProjectTime(models.Model):
+    """Tracked seconds per user, project and local date, maintained from stopped time entries."""
+
+    user = models.ForeignKey("users.CustomUser", on_delete=models.CASCADE, related_name='daily_project_times')
+    project = models.ForeignKey("main.Project", on_delete=models.CASCADE, related_name='daily_project_times')
+    date = models.DateField()
+    seconds = models.PositiveIntegerField(default=0)
+
+    objects = DailyProjectTimeManager()
+
+    class Meta:
+        verbose_name = 'Daily Project Time'
+        verbose_name_plural = 'Daily Project Times'
+        unique_together = ('user', 'project', 'date')
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.user} - {self.project} on {self.date}: {self.seconds}s"
@@ -0,0 +1,64 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import DailyProjectTime, TimeEntry
+from .timesheet import invalidate_timesheet_weeks
+
+
+def entry_state(entry):
+    """
+    What the rollup, the timesheet and the analytics caches compare between saves.
+
+    timezone is the one the entry is rolled up in; entries from before it was stored fall back to the user's.
+    """
+    return {
+        'user_id': entry.user_id,
+        'project_id': entry.project_id,
+        'company_id': entry.project.company_id if entry.project_id else None,
+        'start_time': entry.start_time,
+        'end_time': entry.end_time,
+        'timezone': entry.timezone or entry.user.timezone,
+        'user_timezone': entry.user.timezone,
+    }
+
+@receiver(pre_save, sender=TimeEntry)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    """Read the stored state once for every TimeEntry post_save handler, here and in teams."""
+    instance._previous_state = None
+    if raw:
+        return
+
+    if not instance.timezone:
+        instance.timezone = instance.user.timezone
+    if not instance.pk:
+        return
+
+    previous = (
+        TimeEntry.objects
+        .filter(pk=instance.pk)
+        .values(
+            'user_id', 'project_id', 'start_time', 'end_time', 'timezone',
+            company_id=F('project__company'),
+            user_timezone=F('user__timezone'),
+        )
+        .first()
+    )
+    if previous:
+        previous['timezone'] = previous['timezone'] or previous['user_timezone']
+        instance._previous_state = previous
+
+@receiver(post_save, sender=TimeEntry)
+def update_daily_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None)
+    current = entry_state(instance)
+    DailyProjectTime.objects.apply_entry_change(previous, current)
+    invalidate_timesheet_weeks(previous, current)
+
+@receiver(post_delete, sender=TimeEntry)
+def remove_from_daily_rollup(sender, instance, **kwargs):
+    state = entry_state(instance)
+    DailyProjectTime.objects.apply_entry_change(state, None)
+    invalidate_timesheet_weeks(state)
@@ -0,0 +1,175 @@
+# Standard libs
+from datetime import timedelta
+from io import StringIO
+import json
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Django
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+# Local apps
+from teams.pdf import get_pdf_renderer
+from .benchmark import seed_benchmark_data
+
+
+@tag('benchmark')
+class EndpointBenchmarkTests(TestCase):
+    """
+    Times the key endpoints against a seeded company and holds them to query-count budgets.
+
+    Skipped by default; run with `python manage.py test --tag benchmark`. The budgets do not
+    depend on the data volume, so a lookup that starts running once per row fails here before
+    it shows up in production.
+    """
+
+    USERS = 20
+    PROJECTS = 5
+    ENTRIES_PER_USER = 150
+    TASKS_PER_USER = 30
+    HOLIDAYS_PER_USER = 3
+    DAYS = 90
+    REPEAT = 5
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        cls.results = []
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+        sys.stderr.write("\nEndpoint benchmarks (cold: empty caches, warm: median of the repeats)\n")
+        for label, cold_ms, warm_ms, queries, budget in cls.results:
+            sys.stderr.write(f"  {label:<32} cold {cold_ms:8.1f} ms  warm {warm_ms:8.1f} ms  queries {queries}/{budget}\n")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = seed_benchmark_data(
+            users_per_company=cls.USERS,
+            projects_per_company=cls.PROJECTS,
+            entries_per_user=cls.ENTRIES_PER_USER,
+            tasks_per_user=cls.TASKS_PER_USER,
+            holidays_per_user=cls.HOLIDAYS_PER_USER,
+            days=cls.DAYS,
+        )[0]
+        call_command('rebuild_daily_project_time', stdout=StringIO())
+        call_command('reconcile_pending_holidays', stdout=StringIO())
+
+        cls.employer = cls.company.employees.get(role='employer')
+        cls.employee = cls.company.employees.filter(role='employee').first()
+        cls.project = cls.company.projects.first()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.employer)
+
+    def measure(self, label, budget, request):
+        """
+        Call request() once with empty caches, asserting a successful response within budget queries,
+        then REPEAT more times with warm caches. Records the timings for the summary.
+        """
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            cold_ms = self.timed(request)
+        # Read the count now: later requests reset the connection's query log.
+        query_count = len(queries)
+
+        self.assertLessEqual(
+            query_count,
+            budget,
+            f"{label} ran {query_count} queries, over its budget of {budget}:\n"
+            + "\n".join(query['sql'] for query in queries.captured_queries)
+        )
+
+        warm_ms = statistics.median(self.timed(request) for _ in range(self.REPEAT))
+        self.results.append((label, cold_ms, warm_ms, query_count, budget))
+
+    def timed(self, request):
+        started = time.perf_counter()
+        response = request()
+        # Streaming responses do their work while being consumed.
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        self.assertLess(response.status_code, 300, getattr(response, 'content', b'')[:500])
+        return elapsed
+
+    def post_json(self, url, data):
+        return self.client.post(url, json.dumps(data), content_type='application/json')
+
+    def test_team_charts(self):
+        for filter_option in ('week', 'month', 'allTime'):
+            with self.subTest(filter=filter_option):
+                self.measure(
+                    f"team charts ({filter_option})",
+                    8,
+                    lambda: self.post_json(reverse('teams:team'), {'filter': filter_option})
+                )
+
+    def test_team_page(self):
+        self.measure("team page", 14, lambda: self.client.get(reverse('teams:team')))
+
+    def test_user_analytics(self):
+        for filter_option in ('week', 'month', 'allTime'):
+            with self.subTest(filter=filter_option):
+                self.measure(
+                    f"user analytics ({filter_option})",
+                    10,
+                    lambda: self.post_json(reverse('user_analytics', args=[self.employee.id]), {'filter': filter_option})
+                )
+
+    def test_calendar(self):
+        self.measure("calendar", 10, lambda: self.client.get(reverse('teams:calendar')))
+
+    def test_calendar_events(self):
+        today = timezone.localdate()
+        window = {'start': (today - timedelta(days=35)).isoformat(), 'end': (today + timedelta(days=7)).isoformat()}
+        self.measure("calendar events", 8, lambda: self.client.get(reverse('teams:calendar_events'), window))
+
+    def test_timetracker(self):
+        self.client.force_login(self.employee)
+        self.measure("timetracker", 12, lambda: self.client.get(reverse('timetracker:timetracker')))
+
+    def test_monthly_xlsx_report(self):
+        self.measure(
+            "monthly xlsx report",
+            12,
+            lambda: self.client.get(reverse('teams:project_monthly_report_xlsx', args=[self.project.id]))
+        )
+
+    def test_monthly_pdf_report_enqueue(self):
+        self.measure(
+            "monthly pdf report (enqueue)",
+            6,
+            lambda: self.client.post(reverse('teams:project_monthly_report_pdf', args=[self.project.id]))
+        )
+
+    def test_weekly_pdf_report(self):
+        try:
+            get_pdf_renderer()
+        except ImproperlyConfigured as e:
+            self.skipTest(str(e))
+
+        self.measure(
+            "weekly pdf report",
+            12,
+            lambda: self.client.get(reverse('teams:project_weekly_report', args=[self.project.id]))
+        )
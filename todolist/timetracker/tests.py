@@ -1,3 +1,158 @@
+# Standard libs
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+# Django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+# Local apps
+from main.models import Project
+from teams.models import Company
+from .aggregates import split_by_local_day
+from .models import DailyProjectTime, TimeEntry
+from .timers import TimerAlreadyRunning, start_entry, stop_running_entry
+from .timesheet import build_timesheet_week, get_timesheet_week
+
+
+User = get_user_model()
+
+
+class TimerTests(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name="Acme")
+        self.user = User.objects.create_user(email="employee@example.com", company=company)
+        self.project = Project.objects.create(title="Website", company=company)
+
+    def test_start_entry_starts_a_running_entry(self):
+        entry = start_entry(self.user, "Design", self.project)
+
+        self.assertIsNone(entry.end_time)
+        self.assertEqual(TimeEntry.objects.running_for(self.user), entry)
+
+    def test_start_entry_stops_the_running_entry_first(self):
+        first = start_entry(self.user, "Design", self.project)
+        second = start_entry(self.user, "Build", self.project)
+
+        first.refresh_from_db()
+        self.assertEqual(first.end_time, second.start_time)
+        self.assertEqual(TimeEntry.objects.running_for(self.user), second)
+
+    def test_start_entry_reports_a_concurrently_started_timer(self):
+        start_entry(self.user, "Design", self.project)
+
+        # As if another request started its timer after this one stopped the previous one.
+        with mock.patch('timetracker.timers.stop_running_entry'):
+            with self.assertRaises(TimerAlreadyRunning):
+                start_entry(self.user, "Build", self.project)
+
+        self.assertEqual(TimeEntry.objects.running().filter(user=self.user).count(), 1)
+
+    def test_stop_running_entry_without_a_timer(self):
+        self.assertIsNone(stop_running_entry(self.user))
+
+    def test_stop_running_entry_updates_the_daily_rollup(self):
+        start_time = timezone.now() - timedelta(hours=1)
+        TimeEntry.objects.create(user=self.user, project=self.project, name="Design", start_time=start_time)
+        self.assertFalse(DailyProjectTime.objects.exists())
+
+        entry = stop_running_entry(self.user, start_time + timedelta(minutes=30))
+
+        self.assertEqual(TimeEntry.objects.get(id=entry.id).end_time, start_time + timedelta(minutes=30))
+        self.assertIsNone(TimeEntry.objects.running_for(self.user))
+        self.assertEqual(sum(DailyProjectTime.objects.values_list('seconds', flat=True)), 30 * 60)
+        self.assertIsNone(stop_running_entry(self.user))
+
+
+class SplitByLocalDayTests(TestCase):
+    def test_splits_at_local_midnight(self):
+        # 22:00-02:00 in Berlin (UTC+2 in summer).
+        start = datetime(2025, 7, 7, 20, tzinfo=dt_timezone.utc)
+
+        self.assertEqual(
+            split_by_local_day(start, start + timedelta(hours=4), 'Europe/Berlin'),
+            {date(2025, 7, 7): 2 * 3600, date(2025, 7, 8): 2 * 3600}
+        )
+
+    def test_short_day_when_clocks_go_forward(self):
+        # 2025-03-30 is 23 hours long in London.
+        start = datetime(2025, 3, 29, 23, tzinfo=dt_timezone.utc)
+
+        self.assertEqual(
+            split_by_local_day(start, start + timedelta(hours=25), 'Europe/London'),
+            {date(2025, 3, 29): 3600, date(2025, 3, 30): 23 * 3600, date(2025, 3, 31): 3600}
+        )
+
+    def test_long_day_when_clocks_go_back(self):
+        # 2025-10-26 is 25 hours long in London.
+        start = datetime(2025, 10, 25, 23, tzinfo=dt_timezone.utc)
+
+        self.assertEqual(
+            split_by_local_day(start, start + timedelta(hours=25), 'Europe/London'),
+            {date(2025, 10, 26): 25 * 3600}
+        )
+
+
+class RebuildDailyProjectTimeTests(TestCase):
+    def test_rebuild_replaces_the_rollup_from_stopped_entries(self):
+        company = Company.objects.create(name="Acme")
+        user = User.objects.create_user(email="employee@example.com", company=company)
+        project = Project.objects.create(title="Website", company=company)
+        start = datetime(2025, 7, 7, 9, tzinfo=dt_timezone.utc)
+        TimeEntry.objects.create(user=user, project=project, name="Design", start_time=start, end_time=start + timedelta(hours=2), timezone='UTC')
+        TimeEntry.objects.create(user=user, project=project, name="Build", start_time=timezone.now() - timedelta(hours=1))
+        DailyProjectTime.objects.filter(user=user).update(seconds=1)
+
+        call_command('rebuild_daily_project_time', stdout=StringIO())
+
+        self.assertEqual(
+            list(DailyProjectTime.objects.values_list('date', 'seconds')),
+            [(date(2025, 7, 7), 2 * 3600)]
+        )
+
+
+class TimesheetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="employee@example.com")
+        self.project = Project.objects.create(title="Website", created_by=self.user)
+
+    def add_entry(self, start_time, hours, project=None):
+        return TimeEntry.objects.create(
+            user=self.user, project=project or self.project, name="Build",
+            start_time=start_time, end_time=start_time + timedelta(hours=hours)
+        )
+
+    def test_week_groups_entries_by_project_and_local_day(self):
+        monday = date(2025, 7, 7)
+        self.add_entry(datetime(2025, 7, 7, 9, tzinfo=dt_timezone.utc), 2)
+        self.add_entry(datetime(2025, 7, 7, 13, tzinfo=dt_timezone.utc), 1.5)
+        # 23:30 UTC on Tuesday is already Wednesday in Berlin.
+        self.add_entry(datetime(2025, 7, 8, 23, 30, tzinfo=dt_timezone.utc), 1, project=Project.objects.create(title="App", created_by=self.user))
+        self.add_entry(datetime(2025, 7, 14, 9, tzinfo=dt_timezone.utc), 8)
+
+        with timezone.override('Europe/Berlin'):
+            week = build_timesheet_week(self.user, monday)
+
+        self.assertEqual(week['total'], "04:30")
+        self.assertEqual(week['day_totals'][:3], ["03:30", "00:00", "01:00"])
+        website, app = week['projects']
+        self.assertEqual(website['project']['title'], "Website")
+        self.assertEqual([day['total'] for day in website['days']], ["03:30"])
+        self.assertEqual(app['days'][0]['date'], date(2025, 7, 9))
+
+    def test_cached_week_follows_entry_changes(self):
+        monday = date(2025, 7, 7)
+        entry = self.add_entry(datetime(2025, 7, 7, 9, tzinfo=dt_timezone.utc), 2)
+        with timezone.override('UTC'):
+            self.assertEqual(get_timesheet_week(self.user, monday)['total'], "02:00")
+
+            with self.captureOnCommitCallbacks(execute=True):
+                entry.end_time = entry.start_time + timedelta(hours=3)
+                entry.save()
 
-# Create your tests here.
+            self.assertEqual(get_timesheet_week(self.user, monday)['total'], "03:00")
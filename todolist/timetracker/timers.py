@@ -0,0 +1,55 @@
+# Django
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+# Local apps
+from teams.analytics_cache import invalidate_company_time, invalidate_users
+from .models import DailyProjectTime, TimeEntry
+from .signals import entry_state
+from .timesheet import invalidate_timesheet_weeks
+
+
+class TimerAlreadyRunning(Exception):
+    pass
+
+
+def apply_stopped_entries(entries):
+    """
+    Do the rollup and cache work the save() signals would have done for running entries
+    stopped with a queryset update(). The entries must already carry their new end_time
+    and have user and project loaded.
+    """
+    changes = [({**entry_state(entry), 'end_time': None}, entry_state(entry)) for entry in entries]
+    DailyProjectTime.objects.apply_entry_changes(changes)
+    invalidate_timesheet_weeks(*(current for _, current in changes))
+    invalidate_company_time(*{entry.project.company_id for entry in entries if entry.project_id})
+    invalidate_users(*{entry.user_id for entry in entries})
+
+def stop_running_entry(user, end_time=None):
+    """Stop the user's running entry with one conditional UPDATE; returns it, or None if none was running."""
+    entry = TimeEntry.objects.select_related('user', 'project').running_for(user)
+    if entry is None:
+        return None
+
+    end_time = end_time or timezone.now()
+    with transaction.atomic():
+        # Matches nothing if the entry was stopped since it was read.
+        if not TimeEntry.objects.filter(id=entry.id, end_time__isnull=True).update(end_time=end_time, updated_at=end_time):
+            return None
+        entry.end_time = entry.updated_at = end_time
+        apply_stopped_entries([entry])
+    return entry
+
+def start_entry(user, name, project):
+    """
+    Stop the user's running entry, if any, and start a new one in the same transaction.
+
+    Raises TimerAlreadyRunning if a concurrent request started a timer first.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            stop_running_entry(user, now)
+            return TimeEntry.objects.create(user=user, name=name, project=project, start_time=now)
+    except IntegrityError as e:
+        raise TimerAlreadyRunning("A timer is already running.") from e
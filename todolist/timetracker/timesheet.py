@@ -0,0 +1,109 @@
+# Standard libs
+from datetime import timedelta
+import zoneinfo
+
+# Django
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# Local apps
+from teams.analytics_cache import company_projects_version_key, get_or_compute_many, invalidate, user_projects_version_key
+from .aggregates import local_day_bounds
+from .models import TimeEntry
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+def format_duration(duration):
+    """hh:mm, the format the timesheet uses for every total."""
+    minutes = int(duration.total_seconds()) // 60
+    return f"{minutes // 60:02}:{minutes % 60:02}"
+
+def timesheet_version_key(user_id, start_date):
+    return f"timesheet:version:{user_id}:{start_date.isoformat()}"
+
+def invalidate_timesheet_weeks(*states):
+    """Invalidate the weeks of the given time entry states (dicts with user_id, start_time and user_timezone)."""
+    keys = []
+    for state in states:
+        if state:
+            local_date = timezone.localtime(state['start_time'], zoneinfo.ZoneInfo(state['user_timezone'])).date()
+            keys.append(timesheet_version_key(state['user_id'], week_start(local_date)))
+    invalidate(keys)
+
+def build_timesheet_week(user, start_date):
+    """
+    The user's entries of the week starting on start_date, grouped by project and local day, with totals.
+
+    Durations are computed by the database; running entries count as zero until they are stopped.
+    """
+    tzinfo = timezone.get_current_timezone()
+    range_start, range_end = local_day_bounds(start_date, start_date + timedelta(days=6), tzinfo)
+    week_dates = [start_date + timedelta(days=i) for i in range(7)]
+
+    entries = (
+        TimeEntry.objects
+        .filter(user=user, start_time__gte=range_start, start_time__lt=range_end)
+        .select_related('project')
+        .annotate(
+            day=TruncDate('start_time', tzinfo=tzinfo),
+            tracked=ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField()),
+        )
+        .order_by('start_time')
+    )
+
+    projects = {}
+    day_totals = [timedelta() for _ in week_dates]
+    for entry in entries:
+        tracked = entry.tracked or timedelta()
+        if entry.project_id not in projects:
+            project = entry.project
+            projects[entry.project_id] = {
+                'project': project and {'id': project.id, 'title': project.title, 'color': project.color, 'client': project.client},
+                'days': {},
+                'day_totals': [timedelta() for _ in week_dates],
+                'total': timedelta(),
+            }
+        group = projects[entry.project_id]
+        day = group['days'].setdefault(entry.day, {'date': entry.day, 'entries': [], 'total': timedelta()})
+        day['entries'].append({
+            'id': entry.id,
+            'name': entry.name,
+            'start_time': entry.start_time,
+            'end_time': entry.end_time,
+            'duration': format_duration(tracked),
+        })
+
+        index = (entry.day - start_date).days
+        day['total'] += tracked
+        group['day_totals'][index] += tracked
+        group['total'] += tracked
+        day_totals[index] += tracked
+
+    for group in projects.values():
+        for day in group['days'].values():
+            day['total'] = format_duration(day['total'])
+        group['days'] = list(group['days'].values())
+        group['day_totals'] = [format_duration(total) for total in group['day_totals']]
+        group['total'] = format_duration(group['total'])
+
+    return {
+        'projects': list(projects.values()),
+        'week_dates': week_dates,
+        'day_totals': [format_duration(total) for total in day_totals],
+        'total': format_duration(sum(day_totals, timedelta())),
+    }
+
+def get_timesheet_week(user, start_date):
+    """build_timesheet_week(), cached until an entry of that week, a personal project or a company project changes."""
+    version_keys = [timesheet_version_key(user.id, start_date), user_projects_version_key(user.id)]
+    if user.company_id:
+        version_keys.append(company_projects_version_key(user.company_id))
+
+    result_key = f"timesheet:{user.id}:{start_date.isoformat()}:{timezone.get_current_timezone_name()}"
+    return get_or_compute_many(
+        {user.id: (result_key, version_keys)},
+        lambda items: {user.id: build_timesheet_week(user, start_date)}
+    )[user.id]
@@ -1,6 +1,5 @@
 # Standard libs
-from collections import defaultdict
-from datetime import datetime, date, timedelta
+from datetime import datetime, timedelta
 import json
 
 # Django
@@ -15,42 +14,23 @@ from django.utils.dateparse import parse_date
 from main.models import Project, Task
 from common.decorators import parse_json_body
 from .models import TimeEntry
+from .timers import TimerAlreadyRunning, start_entry, stop_running_entry
+from .timesheet import get_timesheet_week, week_start
 
 
 @login_required
 def timetracker(request):
     user = request.user
 
-    running_entry = user.time_entries.filter(end_time__isnull=True).order_by('-start_time').first()
-
-    start_date_str = request.GET.get('start_date')
-    if start_date_str:
-        start_date = parse_date(start_date_str)
-    else:
-        today = date.today()
-        start_date = today - timedelta(days=today.weekday())
+    running_entry = TimeEntry.objects.select_related('project').running_for(user)
 
+    start_date = parse_date(request.GET.get('start_date') or '') or timezone.localdate()
+    start_date = week_start(start_date)
     end_date = start_date + timedelta(days=6)
-    week_dates = [start_date + timedelta(days=i) for i in range(7)]
-
-    time_entries = TimeEntry.objects.filter(
-        user=user,
-        start_time__date__range=(start_date, end_date)
-    ).order_by('start_time')
-
-    grouped_entries = defaultdict(lambda: defaultdict(list))
-    for entry in time_entries:
-        grouped_entries[entry.project][entry.start_time.date()].append(entry)
-
-    grouped_entries_cleaned = {
-        project: dict(date_dict)
-        for project, date_dict in grouped_entries.items()
-    }
 
     context = {
         'running_entry': running_entry,
-        'grouped_entries': grouped_entries_cleaned,
-        'week_dates': week_dates,
+        'week': get_timesheet_week(user, start_date),
         'start_date': start_date,
         'end_date': end_date
     }
@@ -65,19 +45,18 @@ def start_timer(request):
     project_id = data.get('project_id')
     project = get_object_or_404(Project, id=project_id)
     
-    time_entry = TimeEntry.objects.create(
-        user=request.user, 
-        name=data.get('name'), 
-        project=project,
-    )
-    
-    time_entry.start()
+    try:
+        start_entry(request.user, data.get('name'), project)
+    except TimerAlreadyRunning as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=409)
+
     return JsonResponse({'success': True}, status=200)
 
 @require_http_methods(["POST"])
 @login_required
 def stop_timer(request):
-    request.user.time_entries.filter(end_time__isnull=True).first().stop()
+    if stop_running_entry(request.user) is None:
+        return JsonResponse({'success': False, 'error': 'No timer is running.'}, status=400)
     return JsonResponse({'success': True}, status=200)
 
 @require_http_methods(["PATCH"])
@@ -15,6 +15,17 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
 
+# Outbound email queue (sent by the send_queued_emails worker)
+OUTBOUND_EMAIL_BACKEND = config('OUTBOUND_EMAIL_BACKEND', default=EMAIL_BACKEND)
+OUTBOUND_EMAIL_MAX_ATTEMPTS = config('OUTBOUND_EMAIL_MAX_ATTEMPTS', default=5, cast=int)
+OUTBOUND_EMAIL_RETRY_DELAY = config('OUTBOUND_EMAIL_RETRY_DELAY', default=60, cast=int)
+OUTBOUND_EMAIL_RATE_LIMIT = config('OUTBOUND_EMAIL_RATE_LIMIT', default=0, cast=float)
+
+# PDF reports
+PDF_RENDERER = config('PDF_RENDERER', default='teams.pdf.WeasyPrintRenderer')
+PDF_RENDERER_MAX_CONCURRENCY = config('PDF_RENDERER_MAX_CONCURRENCY', default=2, cast=int)
+PDF_RENDERER_TIMEOUT = config('PDF_RENDERER_TIMEOUT', default=60, cast=int)
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 INSTALLED_APPS = [
@@ -63,6 +74,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'teams.context_processors.navigation',
             ],
         },
     },
@@ -77,6 +89,17 @@ DATABASES = {
     }
 }
 
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='todolist'),
+    }
+}
+# Cached analytics are invalidated when their data changes; running timers are added on every read.
+ANALYTICS_CACHE_TIMEOUT = config('ANALYTICS_CACHE_TIMEOUT', default=300, cast=int)
+NAVIGATION_CACHE_TIMEOUT = config('NAVIGATION_CACHE_TIMEOUT', default=60, cast=int)
+
 # Authentication
 AUTH_USER_MODEL = 'users.CustomUser'
 LOGIN_REDIRECT_URL = '/timetracker/'
@@ -115,3 +138,6 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Tests
+TEST_RUNNER = 'todolist.test_runner.TestRunner'
@@ -7,11 +7,15 @@ from phonenumber_field.modelfields import PhoneNumberField
 # Django
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
-from django.db.models import Sum
+from django.db.models import DurationField, OuterRef, Prefetch, Subquery, Sum
 from django.utils import timezone as tz
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
 # Local apps
+from main.models import Project
+from timetracker.aggregates import local_day_bounds, tracked_duration
+from timetracker.models import TimeEntry
 from .choices import *
 
 
@@ -41,6 +45,32 @@ class CustomUserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+    def with_presence(self, company, local_date=None):
+        """
+        Company employees with their running time entry and today's tracked time, in two queries.
+
+        Sets worked_today (a timedelta, None if nothing was tracked) and the prefetched
+        running_time_entries used by active_time_entry, is_online and total_worked_today.
+        """
+        local_date = local_date or tz.localdate()
+        day_start, day_end = local_day_bounds(local_date, local_date)
+
+        worked_today = (
+            TimeEntry.objects
+            .filter(user=OuterRef('pk'), start_time__gte=day_start, start_time__lt=day_end)
+            .values('user')
+            .annotate(total=Sum(tracked_duration()))
+            .values('total')
+        )
+        running_entries = TimeEntry.objects.running().select_related('project')
+
+        return (
+            self.filter(company=company)
+            .select_related('job_title')
+            .annotate(worked_today=Subquery(worked_today, output_field=DurationField()))
+            .prefetch_related(Prefetch('time_entries', queryset=running_entries, to_attr='running_time_entries'))
+        )
+
 
 class CustomUser(AbstractUser):
     EMPLOYEE_STATUSES = EMPLOYEE_STATUSES
@@ -84,7 +114,9 @@ class CustomUser(AbstractUser):
     offline_workstation_id = models.CharField(max_length=20, blank=True, null=True)
     
     annual_holidays = models.PositiveIntegerField(default=20, blank=True)
-    used_holidays = models.PositiveIntegerField(default=0, blank=True)
+    # Days used before the holiday ledger existed, read once into the user's opening ledger entry.
+    # It stays on the old column, so existing figures survive; used_holidays is derived from the ledger.
+    opening_used_holidays = models.PositiveIntegerField(default=0, editable=False, db_column='used_holidays')
     
     probation_start_date = models.DateField(blank=True, null=True)
     probation_end_date = models.DateField(blank=True, null=True)
@@ -110,7 +142,9 @@ class CustomUser(AbstractUser):
 
     @property
     def active_time_entry(self):
-        return self.time_entries.filter(end_time__isnull=True).first()
+        if hasattr(self, 'running_time_entries'):
+            return self.running_time_entries[0] if self.running_time_entries else None
+        return TimeEntry.objects.running_for(self)
     
     @property
     def age(self):
@@ -129,19 +163,21 @@ class CustomUser(AbstractUser):
             return []
         return self.company.projects
 
-    @property
+    @cached_property
     def all_projects(self):
-        if not self.company or not self.company.projects.exists():
-            return self.personal_projects
-        return self.personal_projects.union(self.company.projects.all())
+        """Personal and company projects; memoized, so a request evaluates it at most once."""
+        return Project.objects.accessible_to(self)
     
     @property
     def total_worked_today(self):
-        entries = self.time_entries.filter(start_time__date=tz.now().date())
-        total = timedelta()
+        if hasattr(self, 'worked_today'):
+            total = self.worked_today or timedelta()
+        else:
+            entries = self.time_entries.filter(start_time__date=tz.now().date())
+            total = timedelta()
 
-        for entry in entries:
-            total += entry.duration
+            for entry in entries:
+                total += entry.duration
 
         total_seconds = int(total.total_seconds())
         hours = total_seconds // 3600
@@ -160,6 +196,12 @@ class CustomUser(AbstractUser):
     def is_employee(self):
         return self.role == "employee"
     
+    @cached_property
+    def used_holidays(self):
+        """Holiday days used: the sum of the yearly ledger balances, or the pre-ledger figure if the ledger has not been opened."""
+        balances = list(self.holiday_balances.values_list('used_days', flat=True))
+        return sum(balances) if balances else self.opening_used_holidays
+
     @property
     def remaining_holidays(self):
         return self.annual_holidays - self.used_holidays
@@ -167,10 +209,6 @@ class CustomUser(AbstractUser):
     def has_enough_holidays(self, days_required):
         return self.remaining_holidays >= days_required
     
-    def adjust_holidays(self, days):
-        self.used_holidays = max(0, self.used_holidays + days)
-        self.save()
-    
     def hours_spent_by_projects(self, target_date, projects):
         entries = self.time_entries.filter(
             start_time__date=target_date,
@@ -207,7 +245,6 @@ class CustomUser(AbstractUser):
         self.offline_location = None
         self.offline_workstation_id = None
         self.annual_holidays = 20
-        self.used_holidays = 0
         self.probation_start_date = None
         self.probation_end_date = None
         self.termination_date = None
@@ -1,3 +1,104 @@
+# Standard libs
+from datetime import timedelta
+
+# Django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+# Local apps
+from main.models import Project, Task
+from teams.models import Company
+from timetracker.models import TimeEntry
+from .views import get_users_analytics
+
+
+User = get_user_model()
+
+
+class UsersAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name="Acme")
+        self.employer = User.objects.create_user(email="employer@example.com", company=self.company, role='employer')
+        self.employee = User.objects.create_user(email="employee@example.com", company=self.company)
+        self.website = Project.objects.create(title="Website", company=self.company, color="#FF0000")
+        self.app = Project.objects.create(title="App", company=self.company, color="#00FF00")
+        self.start_time = timezone.now() - timedelta(days=2)
+
+    def add_entry(self, user, project, hours):
+        TimeEntry.objects.create(user=user, project=project, name="Build", start_time=self.start_time, end_time=self.start_time + timedelta(hours=hours))
+
+    def test_each_user_gets_their_own_time_and_tasks(self):
+        self.add_entry(self.employer, self.website, 1)
+        self.add_entry(self.employee, self.website, 2)
+        self.add_entry(self.employee, self.app, 0.5)
+        Task.objects.create(user=self.employee, project=self.app, title="Ship", due_date=timezone.localdate(), is_completed=True, completed_at=timezone.localdate())
+        personal = Project.objects.create(title="Private", created_by=self.employee)
+        self.add_entry(self.employee, personal, 5)
+
+        analytics = get_users_analytics([self.employer.id, self.employee.id], self.company, 'allTime')
+
+        self.assertEqual(analytics[self.employer.id]['total_time'], "1h 0m 0s")
+        self.assertEqual(analytics[self.employer.id]['total_tasks'], 0)
+        employee = analytics[self.employee.id]
+        self.assertEqual(employee['total_time'], "2h 30m 0s")
+        self.assertEqual(employee['total_tasks'], 1)
+        donut = employee['donut_time_chart_data']
+        self.assertEqual(dict(zip(donut['labels'], donut['datasets'][0]['data'])), {"Website": 2, "App": 0.5})
+
+    def test_invalid_filter(self):
+        self.assertIsNone(get_users_analytics([self.employee.id], self.company, 'decade'))
+
+    def test_view_only_returns_company_members(self):
+        outsider = User.objects.create_user(email="outsider@example.com", company=Company.objects.create(name="Other"))
+        self.add_entry(self.employee, self.website, 2)
+        self.client.force_login(self.employer)
+
+        response = self.client.post(
+            reverse('users_analytics'),
+            {'filter': 'allTime', 'user_ids': [self.employee.id, outsider.id]},
+            content_type='application/json'
+        )
+
+        data = response.json()['data']
+        self.assertEqual(set(data), {str(self.employee.id)})
+        self.assertEqual(data[str(self.employee.id)]['total_time'], "2h 0m 0s")
+
+
+class PresenceTests(TestCase):
+    def test_with_presence_sums_today_and_finds_the_running_entry(self):
+        company = Company.objects.create(name="Acme")
+        worker = User.objects.create_user(email="worker@example.com", company=company)
+        idle = User.objects.create_user(email="idle@example.com", company=company)
+        User.objects.create_user(email="outsider@example.com")
+        project = Project.objects.create(title="Website", company=company)
+        now = timezone.now()
+        TimeEntry.objects.create(user=worker, project=project, name="Build", start_time=now - timedelta(minutes=40), end_time=now - timedelta(minutes=10))
+        running = TimeEntry.objects.create(user=worker, project=project, name="Review", start_time=now - timedelta(minutes=5))
+        TimeEntry.objects.create(user=idle, project=project, name="Old", start_time=now - timedelta(days=2), end_time=now - timedelta(days=2) + timedelta(hours=1))
+
+        with timezone.override('UTC'):
+            employees = {user.id: user for user in User.objects.with_presence(company, (now - timedelta(minutes=40)).date())}
+
+        self.assertEqual(set(employees), {worker.id, idle.id})
+        self.assertEqual(employees[worker.id].active_time_entry, running)
+        self.assertGreaterEqual(employees[worker.id].worked_today, timedelta(minutes=30))
+        self.assertIsNone(employees[idle.id].active_time_entry)
+        self.assertEqual(employees[idle.id].total_worked_today, "00:00")
+
+
+class AllProjectsTests(TestCase):
+    def test_personal_and_company_projects(self):
+        company = Company.objects.create(name="Acme")
+        user = User.objects.create_user(email="ada@example.com", company=company)
+        colleague = User.objects.create_user(email="bob@example.com", company=company)
+        Project.objects.create(title="Website", company=company, created_by=colleague)
+        Project.objects.create(title="Private", created_by=user)
+        Project.objects.create(title="Colleague's", created_by=colleague)
+        Project.objects.create(title="Other", company=Company.objects.create(name="Other"))
 
-# Create your tests here.
+        self.assertEqual(sorted(project.title for project in user.all_projects), ["Private", "Website"])
+        self.assertEqual(sorted(project.title for project in User.objects.create_user(email="solo@example.com").all_projects), [])
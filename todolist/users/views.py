@@ -8,16 +8,18 @@ import json
 # Django
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Count
+from django.db.models import Count, Min
 from django.forms import ValidationError
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth import get_user_model
 
 # Local apps
 from common.decorators import parse_json_body
-from timetracker.models import TimeEntry
+from teams.analytics_cache import cached_users_analytics
+from timetracker.models import DailyProjectTime, TimeEntry
 from main.models import Task
 
 
@@ -132,7 +134,9 @@ def set_timezone(request):
             return JsonResponse({"success": True})
     return JsonResponse({"success": False, "error": "User not authenticated"}, status=400)
 
-def get_date_range_from_filter(filter_option, all_time_first_entry):
+ANALYTICS_FILTERS = ("week", "lastWeek", "month", "lastMonth", "allTime")
+
+def get_date_range_from_filter(filter_option, all_time_start_date):
     today = date.today()
 
     if filter_option == "week":
@@ -154,93 +158,58 @@ def get_date_range_from_filter(filter_option, all_time_first_entry):
         _, last_day = calendar.monthrange(start_date.year, start_date.month)
         end_date = start_date.replace(day=last_day)
     elif filter_option == "allTime":
-        start_date = all_time_first_entry.start_time.date()
+        start_date = all_time_start_date or today
         end_date = today
+    else:
+        return None
 
     return start_date, end_date
 
-def process_donut_time_chart(user, start_date, end_date):
-    project_time = defaultdict(int)
-    
-    current_date = start_date
-    while current_date <= end_date:
-        daily_data = user.hours_spent_by_projects(current_date, user.company.projects.all())
-        for project_title, duration in daily_data.items():
-            project_time[project_title] += duration
-        current_date += timedelta(days=1)
-    
-    labels = list(project_time.keys())
-    data = list(project_time.values())
-    
-    project_color_map = {
-        project.title: project.color
-        for project in user.company.projects.filter(title__in=labels)
-    }
-
-    datasets = [{
-        "data": data,
-        "backgroundColor": [project_color_map.get(title, "#000000") for title in labels],
-        "borderWidth": 1
-    }]
-    
-    return {
-        "labels": labels,
-        "datasets": datasets
-    }
-
-def process_bar_time_chart(user, start_date, end_date):
-    date_labels = []
-    project_time_by_date = defaultdict(lambda: defaultdict(int))
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime("%d/%m/%y")
-        date_labels.append(date_str)
-        daily_data = user.hours_spent_by_projects(current_date, user.company.projects.all())
-        for project_title, duration in daily_data.items():
-            project_time_by_date[project_title][date_str] += duration
-        current_date += timedelta(days=1)
+def get_first_entry_dates(user_ids, company):
+    """Local date of each user's first time entry on a company project, in a single query."""
+    rows = (
+        TimeEntry.objects
+        .filter(user_id__in=user_ids, project__company=company)
+        .values('user_id')
+        .annotate(first_start=Min('start_time'))
+        .order_by()
+    )
+    return {row['user_id']: timezone.localdate(row['first_start']) for row in rows}
 
-    project_titles = list(project_time_by_date.keys())
+USER_TIME_FIELDS = ('user_id', 'project__title', 'project__color')
 
-    project_color_map = {
-        project.title: project.color
-        for project in user.company.projects.filter(title__in=project_titles)
-    }
+def get_user_project_time(user_ids, company, start_date, end_date):
+    """Rollup rows and running entries of the users, to be merged with DailyProjectTime.objects.with_running()."""
+    filters = {'user_id__in': user_ids, 'project__company': company}
+    return (
+        DailyProjectTime.objects.stopped_totals(start_date, end_date, *USER_TIME_FIELDS, **filters),
+        DailyProjectTime.objects.running_entries(*USER_TIME_FIELDS, **filters),
+    )
 
-    datasets = []
-    for project_title in project_titles:
-        data = [project_time_by_date[project_title].get(day, 0) for day in date_labels]
-        datasets.append({
-            "label": project_title,
-            "data": data,
-            "backgroundColor": project_color_map.get(project_title, "#000000")
-        })
+def get_user_project_tasks(user_ids, company, start_date, end_date):
+    return (
+        Task.objects
+        .filter(
+            user_id__in=user_ids,
+            project__company=company,
+            completed_at__gte=start_date,
+            completed_at__lte=end_date
+        )
+        .values('user_id', 'completed_at', 'project__title', 'project__color')
+        .annotate(count=Count('id'))
+        .order_by('completed_at', 'project__title')
+    )
 
+def get_project_color_map(*row_lists):
     return {
-        "labels": date_labels,
-        "datasets": datasets
+        row['project__title']: row['project__color']
+        for rows in row_lists
+        for row in rows
     }
 
-def process_donut_task_chart(user, start_date, end_date):
-    project_task_count = defaultdict(int)
-
-    tasks = Task.objects.filter(
-        user=user,
-        project__in=user.company.projects.all(),
-        completed_at__gte=start_date,
-        completed_at__lte=end_date
-    )
-
-    for task in tasks:
-        project_task_count[task.project.title] += 1
-
-    labels = list(project_task_count.keys())
-    data = list(project_task_count.values())
-
-    project_color_map = {
-        project.title: project.color
-        for project in user.company.projects.filter(title__in=labels)
-    }
+def process_donut_chart(totals_by_project, project_color_map):
+    labels = list(totals_by_project.keys())
+    data = list(totals_by_project.values())
 
     datasets = [{
         "data": data,
@@ -253,36 +222,16 @@ def process_donut_task_chart(user, start_date, end_date):
         "datasets": datasets
     }
 
-def process_bar_task_chart(user, start_date, end_date):
+def process_bar_chart(totals_by_project_and_date, start_date, end_date, project_color_map):
     date_labels = []
-    project_tasks_by_date = defaultdict(lambda: defaultdict(int))
-
     current_date = start_date
     while current_date <= end_date:
-        date_str = current_date.strftime("%d/%m/%y")
-        date_labels.append(date_str)
-
-        tasks = Task.objects.filter(
-            user=user,
-            project__in=user.company.projects.all(),
-            completed_at=current_date
-        )
-
-        for task in tasks:
-            project_tasks_by_date[task.project.title][date_str] += 1
-
+        date_labels.append(current_date.strftime("%d/%m/%y"))
         current_date += timedelta(days=1)
 
-    project_titles = list(project_tasks_by_date.keys())
-
-    project_color_map = {
-        project.title: project.color
-        for project in user.company.projects.filter(title__in=project_titles)
-    }
-
     datasets = []
-    for project_title in project_titles:
-        data = [project_tasks_by_date[project_title].get(day, 0) for day in date_labels]
+    for project_title, totals_by_date in totals_by_project_and_date.items():
+        data = [totals_by_date.get(day, 0) for day in date_labels]
         datasets.append({
             "label": project_title,
             "data": data,
@@ -294,30 +243,124 @@ def process_bar_task_chart(user, start_date, end_date):
         "datasets": datasets
     }
 
-def calculate_total_time(user, start_date, end_date):
-    time_entries = TimeEntry.objects.filter(
-        user=user,
-        project__in=user.company.projects.all(),
-        start_time__date__gte=start_date,
-        start_time__date__lte=end_date
-    )
+def process_donut_time_chart(time_rows, project_color_map):
+    project_time = defaultdict(int)
+    for row in time_rows:
+        project_time[row['project__title']] += row['total'].total_seconds() / 3600
+    return process_donut_chart(project_time, project_color_map)
 
-    total_seconds = int(sum(entry.duration.total_seconds() for entry in time_entries))
+def process_bar_time_chart(time_rows, start_date, end_date, project_color_map):
+    project_time_by_date = defaultdict(lambda: defaultdict(int))
+    for row in time_rows:
+        project_time_by_date[row['project__title']][row['day'].strftime("%d/%m/%y")] += row['total'].total_seconds() / 3600
+    return process_bar_chart(project_time_by_date, start_date, end_date, project_color_map)
+
+def process_donut_task_chart(task_rows, project_color_map):
+    project_task_count = defaultdict(int)
+    for row in task_rows:
+        project_task_count[row['project__title']] += row['count']
+    return process_donut_chart(project_task_count, project_color_map)
+
+def process_bar_task_chart(task_rows, start_date, end_date, project_color_map):
+    project_tasks_by_date = defaultdict(lambda: defaultdict(int))
+    for row in task_rows:
+        project_tasks_by_date[row['project__title']][row['completed_at'].strftime("%d/%m/%y")] += row['count']
+    return process_bar_chart(project_tasks_by_date, start_date, end_date, project_color_map)
+
+def calculate_total_time(time_rows):
+    total_seconds = int(sum(row['total'].total_seconds() for row in time_rows))
 
     hours = total_seconds // 3600
     minutes = (total_seconds % 3600) // 60
     seconds = total_seconds % 60
     return f"{hours}h {minutes}m {seconds}s"
 
-def calculate_total_tasks(user, start_date, end_date):
-    tasks = Task.objects.filter(
-        user=user,
-        project__in=user.company.projects.all(),
-        completed_at__gte=start_date,
-        completed_at__lte=end_date
+def calculate_total_tasks(task_rows):
+    return sum(row['count'] for row in task_rows)
+
+def build_user_analytics(time_rows, task_rows, start_date, end_date):
+    project_color_map = get_project_color_map(time_rows, task_rows)
+
+    return {
+        'donut_time_chart_data': process_donut_time_chart(time_rows, project_color_map),
+        'bar_time_chart_data': process_bar_time_chart(time_rows, start_date, end_date, project_color_map),
+        'donut_task_chart_data': process_donut_task_chart(task_rows, project_color_map),
+        'bar_task_chart_data': process_bar_task_chart(task_rows, start_date, end_date, project_color_map),
+        'total_time': calculate_total_time(time_rows),
+        'total_tasks': calculate_total_tasks(task_rows),
+    }
+
+def get_users_analytics_data(user_ids, company, filter_option):
+    """
+    The cacheable inputs of each user's analytics, from the daily time rollup and one grouped Task query:
+    the date range, time rows, running entries and task rows.
+
+    Returns None for an invalid filter option.
+    """
+    first_entry_dates = get_first_entry_dates(user_ids, company) if filter_option == "allTime" else {}
+
+    date_ranges = {}
+    for user_id in user_ids:
+        date_range = get_date_range_from_filter(filter_option, first_entry_dates.get(user_id))
+        if not date_range:
+            return None
+        date_ranges[user_id] = date_range
+
+    if not date_ranges:
+        return {}
+
+    start_date = min(start for start, _ in date_ranges.values())
+    end_date = max(end for _, end in date_ranges.values())
+
+    time_rows, running = get_user_project_time(user_ids, company, start_date, end_date)
+    time_rows_by_user = defaultdict(list)
+    for row in time_rows:
+        time_rows_by_user[row['user_id']].append(row)
+    running_by_user = defaultdict(list)
+    for row in running:
+        running_by_user[row['user_id']].append(row)
+
+    task_rows_by_user = defaultdict(list)
+    for row in get_user_project_tasks(user_ids, company, start_date, end_date):
+        task_rows_by_user[row['user_id']].append(row)
+
+    data = {}
+    for user_id, (user_start, user_end) in date_ranges.items():
+        data[user_id] = {
+            'start_date': user_start,
+            'end_date': user_end,
+            'time_rows': [row for row in time_rows_by_user[user_id] if user_start <= row['day'] <= user_end],
+            'running': running_by_user[user_id],
+            'task_rows': [row for row in task_rows_by_user[user_id] if user_start <= row['completed_at'] <= user_end],
+        }
+
+    return data
+
+def get_users_analytics(user_ids, company, filter_option):
+    """
+    Chart data and totals per user id. The inputs are cached; the time of running entries is
+    added on every call, so it keeps growing between invalidations.
+
+    Returns None for an invalid filter option.
+    """
+    if filter_option not in ANALYTICS_FILTERS:
+        return None
+
+    cached = cached_users_analytics(
+        user_ids,
+        company,
+        filter_option,
+        lambda missing_ids: get_users_analytics_data(missing_ids, company, filter_option)
     )
 
-    return tasks.count()
+    analytics = {}
+    for user_id, data in cached.items():
+        time_rows = DailyProjectTime.objects.with_running(
+            data['time_rows'], data['running'], data['start_date'], data['end_date'], USER_TIME_FIELDS
+        )
+        analytics[user_id] = build_user_analytics(time_rows, data['task_rows'], data['start_date'], data['end_date'])
+
+    return analytics
 
 @require_http_methods(["POST"])
 @login_required
@@ -331,24 +374,36 @@ def user_analytics(request, user_id):
     data = request.json_data
     filter_option = data.get("filter")
     
-    all_time_first_entry = user.time_entries.filter(project__in=user.company.projects.all()).order_by('start_time').first()
-    start_date, end_date = get_date_range_from_filter(filter_option, all_time_first_entry)
+    if filter_option not in ANALYTICS_FILTERS:
+        return JsonResponse({'success': False, 'error': 'Invalid filter option'}, status=400)
+    
+    analytics = get_users_analytics([user.id], user.company, filter_option)
+    return JsonResponse({'success': True, 'data': analytics[user.id]}, status=200)
+
+@require_http_methods(["POST"])
+@login_required
+@parse_json_body
+def users_analytics(request):
+    company = request.user.company
+    
+    if not company:
+        return JsonResponse({'success': False, 'error': 'Current user does not belong to any company.'}, status=400)
+    
+    data = request.json_data
+    filter_option = data.get("filter")
     
-    donut_time_chart_data = process_donut_time_chart(user, start_date, end_date)
-    bar_time_chart_data = process_bar_time_chart(user, start_date, end_date)
-    donut_task_chart_data = process_donut_task_chart(user, start_date, end_date)
-    bar_task_chart_data = process_bar_task_chart(user, start_date, end_date)
+    user_ids = data.get("user_ids")
+    try:
+        if not isinstance(user_ids, list):
+            raise TypeError
+        requested_ids = {int(user_id) for user_id in user_ids}
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'user_ids must be a list of integers'}, status=400)
     
-    total_time = calculate_total_time(user, start_date, end_date)
-    total_tasks = calculate_total_tasks(user, start_date, end_date)
+    if filter_option not in ANALYTICS_FILTERS:
+        return JsonResponse({'success': False, 'error': 'Invalid filter option'}, status=400)
     
-    context = {
-        'donut_time_chart_data': donut_time_chart_data,
-        'bar_time_chart_data': bar_time_chart_data,
-        'donut_task_chart_data': donut_task_chart_data,
-        'bar_task_chart_data': bar_task_chart_data,
-        'total_time': total_time,
-        'total_tasks': total_tasks,
-    }
+    user_ids = list(User.objects.filter(id__in=requested_ids, company=company).values_list('id', flat=True))
     
-    return JsonResponse({'success': True, 'data': context}, status=200)
+    analytics = get_users_analytics(user_ids, company, filter_option)
+    return JsonResponse({'success': True, 'data': analytics}, status=200)